@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+import numpy as np
+from PIL import Image, ImageDraw
+import Image_Alter
+
+### Synthetic source folders that look roughly like our screenshots (gradients, flat HUD boxes, text)
+def make_synthetic_folder(folder, resolution, count, seed=0):
+    os.makedirs(folder, exist_ok=True)
+    width, height = resolution
+    rng = random.Random(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    for i in range(count):
+        base = np.stack([(xx * 255 // width + i * 7) % 256,
+                         (yy * 255 // height + i * 13) % 256,
+                         ((xx // 7 + yy // 5) + i) % 256], axis=-1).astype(np.uint8)
+        img = Image.fromarray(base)
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x, y = rng.randrange(width), rng.randrange(height)
+            w, h = rng.randrange(10, max(11, width // 6)), rng.randrange(10, max(11, height // 6))
+            draw.rectangle([x, y, x + w, y + h], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            draw.text((x + 2, y + 2), f"HP {rng.randrange(1000)}", fill=(255, 255, 255))
+        img.save(os.path.join(folder, f"synthetic_{i}.jpg"), quality=90)
+
+### Memory high-water mark of this process and of the pool workers it started, in MB
+def peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        scale = 1024 if sys.platform != "darwin" else 1024 * 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+        return {"self": own, "workers": children}
+    except ImportError:
+        # Windows has no resource module, psutil reports the peak working set instead
+        import psutil
+        return {"self": psutil.Process().memory_info().peak_wset / (1024 * 1024), "workers": None}
+
+### One benchmark case, run in its own process so its peak RSS isn't mixed up with the other cases
+def run_case(case):
+    random.seed(case["seed"])
+    if case["backend"] == "numpy":
+        transform = Image_Alter.get_fast_transform(case["pipeline"])
+    else:
+        transform = Image_Alter.get_transform(case["pipeline"])
+
+    output_folder = tempfile.mkdtemp(prefix="augment_bench_")
+    try:
+        report = Image_Alter.augment_images(case["input_folder"], output_folder, transform, case["samples"],
+                                            num_workers=case["workers"], seed=case["seed"],
+                                            reduced_decode=case["reduced_decode"],
+                                            output_size=case["output_size"])
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    peak_rss = peak_rss_mb()
+    if case["workers"] <= 1:
+        # No pool was started, whatever the OS reports for children isn't ours
+        peak_rss["workers"] = None
+
+    return {
+        "images_per_sec": report["images_per_sec"],
+        "wall_time": report["wall_time"],
+        # Stage times are summed over threads and workers, per image makes them comparable between cases
+        "stage_ms_per_image": {stage: seconds * 1000 / case["samples"] for stage, seconds in report["stages"].items()},
+        "augment_share": report["augment_share"],
+        "encode_share": report["encode_share"],
+        "peak_rss_mb": peak_rss,
+    }
+
+def _case_process(case, results):
+    results.put(run_case(case))
+
+def run_case_isolated(case):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_case_process, args=(case, results))
+    proc.start()
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"Benchmark case crashed (exit code {proc.exitcode})")
+    finally:
+        proc.join()
+
+### Version info so results from different checkouts can be told apart
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import torch, torchvision, cv2, PIL
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "opencv": cv2.__version__,
+        "torch": torch.__version__,
+        "torchvision": torchvision.__version__,
+    }
+
+def parse_resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Image_Alter augmentation throughput on synthetic images.")
+    parser.add_argument("--resolutions", default="640x360,1920x1080", help="comma separated WIDTHxHEIGHT list")
+    parser.add_argument("--counts", default="20,100", help="comma separated number of source images per folder")
+    parser.add_argument("--samples", type=int, default=100, help="augmented samples generated per case")
+    parser.add_argument("--pipelines", default="original,color_manipulation")
+    parser.add_argument("--backends", default="torchvision,numpy")
+    parser.add_argument("--workers", default="1", help="comma separated worker counts")
+    parser.add_argument("--reduced-decode", action="store_true", help="also run every case with reduced JPEG decoding")
+    parser.add_argument("--output-size", default="original", choices=["original", "crop"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="augment_bench_src_")
+    results = {"environment": environment_info(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "cases": []}
+    try:
+        for resolution in [parse_resolution(r) for r in args.resolutions.split(",")]:
+            for count in [int(c) for c in args.counts.split(",")]:
+                folder = os.path.join(work_dir, f"{resolution[0]}x{resolution[1]}_{count}")
+                make_synthetic_folder(folder, resolution, count, seed=args.seed)
+                for pipeline in args.pipelines.split(","):
+                    for backend in args.backends.split(","):
+                        for workers in [int(w) for w in args.workers.split(",")]:
+                            for reduced_decode in ([False, True] if args.reduced_decode else [False]):
+                                case = {"resolution": f"{resolution[0]}x{resolution[1]}", "source_images": count,
+                                        "samples": args.samples, "pipeline": pipeline, "backend": backend,
+                                        "workers": workers, "reduced_decode": reduced_decode,
+                                        "output_size": args.output_size, "seed": args.seed, "input_folder": folder}
+                                print(f"Running {pipeline}/{backend} at {case['resolution']} x{count}, "
+                                      f"{workers} worker(s), reduced decode {reduced_decode}", file=sys.stderr)
+                                result = run_case_isolated(case)
+                                del case["input_folder"]
+                                results["cases"].append({**case, **result})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
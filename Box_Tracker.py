@@ -0,0 +1,91 @@
+import numpy as np
+import cv2
+
+### Carrying detections forward between detector runs with sparse optical flow
+class BoxTracker:
+    # reset() with a frame and the detector's boxes, then update() with each following frame moves every box
+    # by the median motion of the points tracked inside it (Lucas-Kanade on a small grayscale copy), scaling it
+    # by how far those points spread apart. Boxes and labels come back in the same detections format the
+    # detector produces, so drawing doesn't care which one made them.
+    def __init__(self, track_width=320, points_per_box=16, min_points=3):
+        self.track_width = track_width
+        self.points_per_box = points_per_box
+        self.min_points = min_points
+        self.detections = None
+        self.prev_gray = None
+        self.points = None
+        self.owners = None
+        self.scale = 1.0
+        self.small = None
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+    def _gray(self, img):
+        h, w = img.shape[:2]
+        self.scale = self.track_width / w if w > self.track_width else 1.0
+        size = (max(1, round(w * self.scale)), max(1, round(h * self.scale)))
+        self.small = cv2.resize(img, size, dst=self.small, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(self.small, cv2.COLOR_RGB2GRAY)
+
+    def _box_points(self, gray, box):
+        # Corners inside the (slightly shrunk) box, topped up with a grid when the box is too flat for corners
+        x1, y1, x2, y2 = box
+        mx, my = (x2 - x1) * 0.1, (y2 - y1) * 0.1
+        x1, y1, x2, y2 = int(x1 + mx), int(y1 + my), int(np.ceil(x2 - mx)), int(np.ceil(y2 - my))
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(gray.shape[1], x2), min(gray.shape[0], y2)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return np.zeros((0, 2), np.float32)
+        corners = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], self.points_per_box, 0.01, 3)
+        points = corners.reshape(-1, 2) + (x1, y1) if corners is not None else np.zeros((0, 2), np.float32)
+        if len(points) < self.min_points:
+            gx, gy = np.meshgrid(np.linspace(x1, x2 - 1, 3), np.linspace(y1, y2 - 1, 3))
+            points = np.concatenate([points, np.stack([gx.ravel(), gy.ravel()], axis=1)])
+        return points.astype(np.float32)
+
+    def reset(self, img, detections):
+        gray = self._gray(img)
+        self.detections = {key: value.copy() for key, value in detections.items()}
+        boxes = self.detections["xyxy"] * self.scale
+        per_box = [self._box_points(gray, box) for box in boxes]
+        self.points = np.concatenate(per_box).reshape(-1, 1, 2) if per_box else np.zeros((0, 1, 2), np.float32)
+        self.owners = np.concatenate([np.full(len(p), i) for i, p in enumerate(per_box)]) if per_box else np.zeros(0, int)
+        self.prev_gray = gray
+
+    def update(self, img):
+        # Tracked detections for img, or None before the first reset()
+        if self.detections is None:
+            return None
+        gray = self._gray(img)
+        if len(self.points) == 0:
+            self.prev_gray = gray
+            return self.detections
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.lk_params)
+        # Forward-backward check: keep only points that track back to where they started
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, new_points, None, **self.lk_params)
+        error = np.linalg.norm((back_points - self.points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < 1.0)
+
+        old = self.points.reshape(-1, 2)
+        new = new_points.reshape(-1, 2)
+        boxes = self.detections["xyxy"] * self.scale
+        for i in range(len(boxes)):
+            mask = good & (self.owners == i)
+            if mask.sum() < self.min_points:
+                continue  # Lost this one, it stays where it was until the next detector run
+            shift = np.median(new[mask] - old[mask], axis=0)
+            old_spread = np.linalg.norm(old[mask] - np.median(old[mask], axis=0), axis=1)
+            new_spread = np.linalg.norm(new[mask] - np.median(new[mask], axis=0), axis=1)
+            ratio = np.median(new_spread / np.maximum(old_spread, 1e-3)) if np.median(old_spread) > 1 else 1.0
+            ratio = float(np.clip(ratio, 0.8, 1.25))
+            cx, cy = (boxes[i, 0] + boxes[i, 2]) / 2 + shift[0], (boxes[i, 1] + boxes[i, 3]) / 2 + shift[1]
+            hw, hh = (boxes[i, 2] - boxes[i, 0]) / 2 * ratio, (boxes[i, 3] - boxes[i, 1]) / 2 * ratio
+            boxes[i] = (cx - hw, cy - hh, cx + hw, cy + hh)
+
+        self.detections["xyxy"] = (boxes / self.scale).astype(np.float32)
+        # Only the points that survived are followed further
+        self.points = new_points[good].reshape(-1, 1, 2)
+        self.owners = self.owners[good]
+        self.prev_gray = gray
+        return self.detections
@@ -0,0 +1,499 @@
+import os
+import sys
+import time
+import math
+import ctypes
+import argparse
+from threading import Condition
+import numpy as np
+import cv2
+from PIL import Image, ImageGrab
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+
+### Reusable frame buffers, so steady-state capture doesn't allocate a new frame every grab
+class RingFrame:
+    # One slot of a FrameRing. The array stays valid until release() is called, after that the ring hands it
+    # out again and it will be overwritten. Works as a context manager that releases on exit.
+    def __init__(self, ring, array):
+        self.ring = ring
+        self.array = array
+        self.in_use = False
+
+    def release(self):
+        self.ring._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class FrameRing:
+    # Pool of preallocated (height, width, channels) uint8 frames shared by a capture thread and its consumers.
+    # Slots are allocated lazily up to capacity, so a ring sized for a deep encode queue only costs memory once
+    # the queue actually fills up. acquire() blocks while every slot is in use, which is the backpressure.
+    def __init__(self, width, height, channels=3, capacity=8):
+        self.shape = (height, width, channels)
+        self.capacity = capacity
+        self.free = []
+        self.allocated = 0
+        self.condition = Condition()
+
+    def acquire(self, timeout=None):
+        with self.condition:
+            if not self.free and self.allocated < self.capacity:
+                self.allocated += 1
+                self.free.append(RingFrame(self, np.empty(self.shape, dtype=np.uint8)))
+            if not self.condition.wait_for(lambda: self.free, timeout):
+                return None
+            frame = self.free.pop()
+            frame.in_use = True
+            return frame
+
+    def _release(self, frame):
+        with self.condition:
+            # Releasing twice is harmless, the slot only goes back to the pool once
+            if frame.in_use:
+                frame.in_use = False
+                self.free.append(frame)
+                self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {"capacity": self.capacity, "allocated": self.allocated, "in_use": self.allocated - len(self.free)}
+
+def grab_into(backend, ring, timeout=None):
+    # Captures the next frame straight into a ring slot. Returns the RingFrame (release it when done) or None.
+    frame = ring.acquire(timeout)
+    if frame is None:
+        return None
+    if backend.grab(out=frame.array) is None:
+        frame.release()
+        return None
+    return frame
+
+### Capture backends: every backend has width, height, grab(out=None) -> RGB uint8 array (or None on failure)
+### and close(). With out, a (height, width, 3) array, the frame is written into it instead of a new array.
+class CaptureBackend:
+    width = 0
+    height = 0
+
+    def grab(self, out=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class GDIWindowBackend(CaptureBackend):
+    # BitBlt of a window's device context. x/y offset into the window, so borders and title bars can be cut off.
+    # The device contexts, bitmap and pixel buffer are created on the first grab and reused until close().
+    # Windows only, the other backends work everywhere.
+    def __init__(self, hwnd, width, height, x=0, y=0):
+        if not hasattr(ctypes, "windll"):
+            raise Exception("Window capture is only available on Windows.")
+        self.hwnd = hwnd
+        self.width = width
+        self.height = height
+        self.x = x
+        self.y = y
+        self.hwnd_dc = None
+        self.mfc_dc = None
+        self.bitmap = None
+        self.bmpstr = None
+        self.bgra = None
+
+    def _open(self):
+        self.hwnd_dc = ctypes.windll.user32.GetDC(self.hwnd)
+        self.mfc_dc = ctypes.windll.gdi32.CreateCompatibleDC(self.hwnd_dc)
+        self.bitmap = ctypes.windll.gdi32.CreateCompatibleBitmap(self.hwnd_dc, self.width, self.height)
+        ctypes.windll.gdi32.SelectObject(self.mfc_dc, self.bitmap)
+        self.bmpstr = ctypes.create_string_buffer(self.width * self.height * 4)
+        self.bgra = np.frombuffer(self.bmpstr, dtype='uint8').reshape((self.height, self.width, 4))  # BGRA format
+
+    def grab(self, out=None):
+        try:
+            if self.bitmap is None:
+                self._open()
+            ctypes.windll.gdi32.BitBlt(self.mfc_dc, 0, 0, self.width, self.height, self.hwnd_dc, self.x, self.y, 0x00CC0020)
+            ctypes.windll.gdi32.GetBitmapBits(self.bitmap, len(self.bmpstr), self.bmpstr)
+
+            # Convert BGRA to RGB, straight into out when given
+            return cv2.cvtColor(self.bgra, cv2.COLOR_BGRA2RGB, dst=out)
+        except Exception as e:
+            print(f"Error capturing window: {e}")
+            self.close()
+            return None
+
+    def close(self):
+        # Clean up
+        if self.bitmap:
+            ctypes.windll.gdi32.DeleteObject(self.bitmap)
+        if self.mfc_dc:
+            ctypes.windll.gdi32.DeleteDC(self.mfc_dc)
+        if self.hwnd_dc:
+            ctypes.windll.user32.ReleaseDC(self.hwnd, self.hwnd_dc)
+        self.hwnd_dc = None
+        self.mfc_dc = None
+        self.bitmap = None
+        self.bmpstr = None
+        self.bgra = None
+
+class ImageGrabBackend(CaptureBackend):
+    # PIL's screen grab, slow per call but needs nothing beyond Pillow
+    def __init__(self, region):
+        self.left, self.top, self.right, self.bottom = region
+        self.width = self.right - self.left
+        self.height = self.bottom - self.top
+
+    def grab(self, out=None):
+        try:
+            img = ImageGrab.grab(bbox=(self.left, self.top, self.right, self.bottom))
+            rgb = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+            if out is None:
+                return rgb.copy()
+            np.copyto(out, rgb)
+            return out
+        except Exception as e:
+            print(f"Error capturing screen region: {e}")
+            return None
+
+class MssBackend(CaptureBackend):
+    # mss keeps its device context and grab buffer between calls as long as the same instance is reused, so one
+    # instance lives for the whole capture. mss instances can't be shared between threads, so it is opened
+    # lazily by whichever thread grabs first. mss still hands back each shot as a new bytes object, the
+    # conversion to RGB is what goes into out.
+    def __init__(self, region):
+        import mss  # noqa: F401, fail here rather than on the first grab
+        self.left, self.top, self.right, self.bottom = region
+        self.width = self.right - self.left
+        self.height = self.bottom - self.top
+        self.monitor = {"left": self.left, "top": self.top, "width": self.width, "height": self.height}
+        self.sct = None
+
+    def grab(self, out=None):
+        try:
+            if self.sct is None:
+                import mss
+                self.sct = mss.mss()
+            shot = self.sct.grab(self.monitor)
+            img = np.frombuffer(shot.raw, dtype=np.uint8).reshape((shot.height, shot.width, 4))  # BGRA format
+            return cv2.cvtColor(img, cv2.COLOR_BGRA2RGB, dst=out)
+        except Exception as e:
+            print(f"Error capturing screen region: {e}")
+            return None
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+class ReplayBackend(CaptureBackend):
+    # Plays back a video file or a folder of images (sorted by name) as if they were being captured
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.video = None
+        self.files = None
+        self.position = 0
+        self.bgr = None
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                self.files = sorted(e.path for e in entries if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))
+            if not self.files:
+                raise Exception(f'No images found in "{path}"')
+            with Image.open(self.files[0]) as img:
+                self.width, self.height = img.size
+        else:
+            self.video = cv2.VideoCapture(path)
+            if not self.video.isOpened():
+                raise Exception(f'Could not open video "{path}"')
+            self.width = int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def grab(self, out=None):
+        if self.files is not None:
+            if self.position >= len(self.files):
+                if not self.loop:
+                    return None
+                self.position = 0
+            with Image.open(self.files[self.position]) as img:
+                frame = np.asarray(img.convert("RGB"))
+            self.position += 1
+            if frame.shape[:2] != (self.height, self.width):
+                # Folders can mix sizes, every frame is brought to the size of the first one
+                return cv2.resize(frame, (self.width, self.height), dst=out, interpolation=cv2.INTER_AREA)
+            if out is None:
+                return frame.copy()
+            np.copyto(out, frame)
+            return out
+
+        # read() decodes into the same BGR buffer every time once it has the right size
+        ret, self.bgr = self.video.read(self.bgr)
+        if not ret and self.loop:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, self.bgr = self.video.read(self.bgr)
+        if not ret:
+            return None
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB, dst=out)
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+
+class SyntheticBackend(CaptureBackend):
+    # Generated frames for tests and benchmarks: a scrolling gradient with a box moving across it, and every
+    # static_frames frames (when set) the picture freezes for a while like an idle game window
+    def __init__(self, width=1280, height=720, static_frames=0, seed=0):
+        self.width = width
+        self.height = height
+        self.static_frames = static_frames
+        self.rng = np.random.default_rng(seed)
+        yy, xx = np.mgrid[0:height, 0:width]
+        self.background = np.stack([xx * 255 // max(1, width - 1), yy * 255 // max(1, height - 1),
+                                    (xx + yy) * 255 // max(1, width + height - 2)], axis=-1).astype(np.uint8)
+        self.frame_index = 0
+
+    def grab(self, out=None):
+        step = self.frame_index
+        if self.static_frames:
+            # Alternate between moving and frozen stretches of static_frames frames each
+            cycle, offset = divmod(self.frame_index, 2 * self.static_frames)
+            step = cycle * self.static_frames + min(offset, self.static_frames)
+        self.frame_index += 1
+
+        # np.roll without the temporary: copy the two halves of the scrolled background
+        if out is None:
+            out = np.empty_like(self.background)
+        shift = (step * 4) % self.width
+        out[:, shift:] = self.background[:, :self.width - shift]
+        out[:, :shift] = self.background[:, self.width - shift:]
+        size = max(8, min(self.width, self.height) // 6)
+        x = (step * 7) % max(1, self.width - size)
+        y = (step * 3) % max(1, self.height - size)
+        out[y:y + size, x:x + size] = (255, 64, 32)
+        return out
+
+### Several named regions out of one grab
+def bounding_box(regions):
+    # Smallest (left, top, right, bottom) covering every region in a {name: (left, top, right, bottom)} dict
+    boxes = list(regions.values())
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+class RegionSplitter:
+    # Cuts named regions out of a frame whose top-left pixel is at origin in the regions' coordinates (the
+    # bounding box corner for a screen grab, (0, 0) when the regions are given relative to the frame). The
+    # regions are NumPy views into the frame, nothing is copied, so they are only valid as long as the frame is.
+    def __init__(self, regions, origin=(0, 0), frame_size=None):
+        ox, oy = origin
+        self.slices = {}
+        for name, (left, top, right, bottom) in regions.items():
+            if right <= left or bottom <= top or left < ox or top < oy:
+                raise Exception(f'Region "{name}" {(left, top, right, bottom)} is empty or outside the capture area')
+            if frame_size and (right - ox > frame_size[0] or bottom - oy > frame_size[1]):
+                raise Exception(f'Region "{name}" {(left, top, right, bottom)} is outside the capture area')
+            self.slices[name] = (slice(top - oy, bottom - oy), slice(left - ox, right - ox))
+
+    def split(self, frame):
+        return {name: frame[rows, cols] for name, (rows, cols) in self.slices.items()}
+
+def open_multi_region_backend(regions, name="mss"):
+    # One backend for the bounding box of all regions plus the splitter that cuts them back out, so N regions
+    # still cost a single screen read
+    box = bounding_box(regions)
+    backend = open_region_backend(box, name)
+    return backend, RegionSplitter(regions, origin=box[:2], frame_size=(backend.width, backend.height))
+
+### Picking a backend for a screen region
+REGION_BACKENDS = ("mss", "imagegrab")
+
+def open_region_backend(region, name="mss"):
+    # mss is much faster per grab, fall back to ImageGrab when it isn't installed
+    if name == "mss":
+        try:
+            return MssBackend(region)
+        except ImportError:
+            print("mss is not installed, using ImageGrab for region capture.")
+            return ImageGrabBackend(region)
+    if name == "imagegrab":
+        return ImageGrabBackend(region)
+    raise Exception(f'Unknown region capture backend: {name}')
+
+### Capture timing and change detection, shared by the screenshot and video capture tools
+TICK_POLICIES = ("skip", "catch_up")
+
+class CaptureScheduler:
+    # Fires ticks at start + n * interval on the monotonic clock, so capture and encode time don't add up
+    # into drift the way sleep(delay) after each frame does. When a tick is missed, "skip" jumps ahead to the
+    # next future tick and "catch_up" fires the missed ticks back to back until it is on schedule again.
+    def __init__(self, interval, policy="skip"):
+        if policy not in TICK_POLICIES:
+            raise Exception('Unknown tick policy: {}'.format(policy))
+        self.interval = interval
+        self.policy = policy
+        self.start_time = None
+        self.next_deadline = None
+        self.ticks = 0
+        self.missed = 0
+        self.last_tick = None
+        # Running mean / variance of the gaps between ticks (Welford)
+        self.gap_count = 0
+        self.gap_mean = 0.0
+        self.gap_m2 = 0.0
+        self.max_lateness = 0.0
+
+    def wait(self):
+        # Sleeps until the next tick and returns its time in seconds since the scheduler started
+        now = time.monotonic()
+        if self.start_time is None:
+            self.start_time = now
+            self.next_deadline = now
+        if now < self.next_deadline:
+            time.sleep(self.next_deadline - now)
+            now = time.monotonic()
+
+        self.max_lateness = max(self.max_lateness, now - self.next_deadline)
+        if self.last_tick is not None:
+            gap = now - self.last_tick
+            self.gap_count += 1
+            delta = gap - self.gap_mean
+            self.gap_mean += delta / self.gap_count
+            self.gap_m2 += delta * (gap - self.gap_mean)
+        self.last_tick = now
+        self.ticks += 1
+
+        self.next_deadline += self.interval
+        if self.policy == "skip" and self.interval > 0 and now >= self.next_deadline:
+            # Ticks already due by now are dropped, the next one is the first tick after now.
+            # "catch_up" leaves them queued and fires them back to back, so they aren't missed.
+            behind = int((now - self.next_deadline) // self.interval) + 1
+            self.missed += behind
+            self.next_deadline += behind * self.interval
+        return now - self.start_time
+
+    def get_stats(self):
+        elapsed = (self.last_tick - self.start_time) if self.ticks > 1 else 0.0
+        return {
+            "target_fps": 1.0 / self.interval if self.interval > 0 else None,
+            "achieved_fps": (self.ticks - 1) / elapsed if elapsed > 0 else 0.0,
+            "jitter_ms": math.sqrt(self.gap_m2 / self.gap_count) * 1000 if self.gap_count > 1 else 0.0,
+            "max_lateness_ms": self.max_lateness * 1000,
+            "missed_deadlines": self.missed,
+        }
+
+CHANGE_METRICS = ("mean", "tiles")
+
+class ChangeDetector:
+    # Decides whether a frame differs enough from the last saved one to be worth writing. Frames are compared
+    # as small grayscale thumbnails, either by mean absolute difference ("mean", threshold in 0-255 levels)
+    # or by how many tiles of the thumbnail changed ("tiles", threshold is a tile count). min_interval stops
+    # bursts of saves while something animates, max_interval still saves a frame now and then when nothing changes.
+    def __init__(self, threshold=4.0, metric="mean", min_interval=0.0, max_interval=None, thumb_width=128, tile_size=16, tile_threshold=8.0):
+        if metric not in CHANGE_METRICS:
+            raise Exception('Unknown change metric: {}'.format(metric))
+        self.threshold = threshold
+        self.metric = metric
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.thumb_width = thumb_width
+        self.tile_size = tile_size
+        self.tile_threshold = tile_threshold
+        self.reference = None
+        self.last_save = None
+        # Scratch thumbnails reused every frame, reference and gray swap places when a frame is saved
+        self.small = None
+        self.gray = None
+
+    def _thumbnail(self, img):
+        # Shrink before dropping colour so cvtColor only touches the small image
+        h, w = img.shape[:2]
+        thumb_height = max(1, round(h * self.thumb_width / w))
+        self.small = cv2.resize(img, (self.thumb_width, thumb_height), dst=self.small, interpolation=cv2.INTER_AREA)
+        self.gray = cv2.cvtColor(self.small, cv2.COLOR_RGB2GRAY, dst=self.gray)
+        return self.gray
+
+    def score(self, thumb):
+        if self.reference is None or self.reference.shape != thumb.shape:
+            return float("inf")
+        diff = cv2.absdiff(thumb, self.reference)
+        if self.metric == "mean":
+            return float(diff.mean())
+        # Mean difference per tile, a tile counts as changed once it passes tile_threshold
+        h, w = diff.shape
+        t = self.tile_size
+        tiles = cv2.resize(diff, (max(1, w // t), max(1, h // t)), interpolation=cv2.INTER_AREA)
+        return float(np.count_nonzero(tiles > self.tile_threshold))
+
+    def should_save(self, img, frame_time):
+        since_save = None if self.last_save is None else frame_time - self.last_save
+        if since_save is not None and since_save < self.min_interval:
+            return False
+        thumb = self._thumbnail(img)
+        due = since_save is None or (self.max_interval is not None and since_save >= self.max_interval)
+        if not due and self.score(thumb) < self.threshold:
+            return False
+        self.reference, self.gray = thumb, self.reference
+        self.last_save = frame_time
+        return True
+
+    def update(self, img):
+        # Change score against the previous frame, which then becomes the reference. Used for the scores stored
+        # with recorded frames, where nothing is skipped at capture time.
+        thumb = self._thumbnail(img)
+        score = self.score(thumb)
+        self.reference, self.gray = thumb, self.reference
+        return score if score != float("inf") else None
+
+### Throughput of a backend, e.g. python Capture_Backends.py synthetic --frames 300
+def benchmark_backend(backend, frames=200, warmup=10):
+    ring = FrameRing(backend.width, backend.height, capacity=2)
+    for _ in range(warmup):
+        frame = grab_into(backend, ring)
+        if frame is not None:
+            frame.release()
+    failed = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame = grab_into(backend, ring)
+        if frame is None:
+            failed += 1
+        else:
+            frame.release()
+    elapsed = time.perf_counter() - start
+    return {"frames": frames, "failed": failed, "seconds": elapsed, "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "ms_per_frame": elapsed * 1000 / frames if frames else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure capture backend throughput.")
+    parser.add_argument("backend", choices=["mss", "imagegrab", "replay", "synthetic"])
+    parser.add_argument("--region", default="0,0,1280,720", help="left,top,right,bottom for mss/imagegrab")
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT for synthetic frames")
+    parser.add_argument("--path", help="video file or image folder for replay")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.backend in REGION_BACKENDS:
+        backend = open_region_backend(tuple(int(v) for v in args.region.split(",")), args.backend)
+    elif args.backend == "replay":
+        if not args.path:
+            parser.error("replay needs --path")
+        backend = ReplayBackend(args.path)
+    else:
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        backend = SyntheticBackend(width, height)
+
+    with backend:
+        result = benchmark_backend(backend, args.frames)
+    print(f"{args.backend} {backend.width}x{backend.height}: {result['fps']:.1f} FPS, "
+          f"{result['ms_per_frame']:.2f} ms per frame, {result['failed']} failed grabs", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import importlib.util
+import numpy as np
+import cv2
+
+### CPU inference on an exported copy of a YOLO .pt model. The export runs once per model file (keyed by its
+### hash, image size and precision) into a cache folder and is reused by every later session.
+RUNTIMES = ("pytorch", "onnxruntime", "openvino")
+PRECISIONS = ("fp32", "fp16", "int8")
+CACHE_FOLDER = "model_cache"
+# Module each exported runtime needs, the optional ones may not be installed
+RUNTIME_MODULES = {"onnxruntime": "onnxruntime", "openvino": "openvino"}
+
+def available_runtimes():
+    return tuple(runtime for runtime in RUNTIMES
+                 if runtime not in RUNTIME_MODULES or importlib.util.find_spec(RUNTIME_MODULES[runtime]) is not None)
+
+def resolve_runtime(runtime):
+    # Returns (runtime to use, note or None): a runtime that isn't installed falls back to ONNX Runtime, or to
+    # PyTorch when that's missing too
+    available = available_runtimes()
+    if runtime in available:
+        return runtime, None
+    fallback = "onnxruntime" if "onnxruntime" in available else "pytorch"
+    return fallback, f"{runtime} is not installed, using {fallback} instead."
+
+def model_file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def export_cached(model_path, imgsz=640, precision="fp32", cache_dir=None):
+    # Returns (onnx path, class names), exporting and caching on the first call for this model file
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(model_path)), CACHE_FOLDER)
+    os.makedirs(cache_dir, exist_ok=True)
+    key = f"{model_file_hash(model_path)[:16]}_{imgsz}"
+    onnx_path = os.path.join(cache_dir, key + ".onnx")
+    meta_path = os.path.join(cache_dir, key + ".json")
+
+    if not (os.path.exists(onnx_path) and os.path.exists(meta_path)):
+        from ultralytics import YOLO
+        # ultralytics writes the export next to the .pt, so export a copy in a scratch folder inside the cache
+        # rather than touching anything (like an .onnx the user keeps) next to the original model
+        with tempfile.TemporaryDirectory(dir=cache_dir) as scratch:
+            model_copy = os.path.join(scratch, "model" + os.path.splitext(model_path)[1])
+            shutil.copyfile(model_path, model_copy)
+            model = YOLO(model_copy)
+            # Dynamic batch so micro-batches run as one call
+            exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+            shutil.move(exported, onnx_path + ".tmp")
+        with open(meta_path, "w") as f:
+            json.dump({"names": {int(k): v for k, v in model.names.items()}, "imgsz": imgsz, "source": os.path.basename(model_path)}, f)
+        os.replace(onnx_path + ".tmp", onnx_path)
+        print(f"Exported {model_path} to {onnx_path}")
+
+    with open(meta_path) as f:
+        names = {int(k): v for k, v in json.load(f)["names"].items()}
+
+    if precision == "int8":
+        # Dynamic int8 quantization of the weights, cached next to the fp32 export
+        int8_path = os.path.join(cache_dir, key + "_int8.onnx")
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(onnx_path, int8_path + ".tmp", weight_type=QuantType.QUInt8)
+            os.replace(int8_path + ".tmp", int8_path)
+        onnx_path = int8_path
+    return onnx_path, names
+
+### Results in the shape the rest of the code reads from ultralytics (result.boxes.xyxy / conf / cls)
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+class DetectionResult:
+    def __init__(self, xyxy, conf, cls):
+        self.boxes = _Boxes(xyxy, conf, cls)
+
+class ExportedDetector:
+    # Callable like an ultralytics model: detector(frame or [frames], verbose=False) -> [DetectionResult, ...].
+    # Frames are uint8 arrays in the channel order ultralytics assumes for numpy input (BGR, flipped to RGB for
+    # the network), so both backends see identical pixels. They're letterboxed to imgsz and the raw
+    # (batch, 4 + classes, anchors) output is decoded with a per-class NMS here. threads = 0 leaves the thread
+    # count to the runtime.
+    def __init__(self, onnx_path, names, runtime="onnxruntime", precision="fp32", threads=0, imgsz=640, conf=0.25, iou=0.7):
+        self.names = names
+        self.runtime = runtime
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.batch = None
+        if runtime == "onnxruntime":
+            import onnxruntime as ort
+            if precision == "fp16":
+                print("fp16 isn't faster on the ONNX Runtime CPU provider, running fp32.")
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                options.intra_op_num_threads = threads
+                options.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+        elif runtime == "openvino":
+            import openvino as ov
+            config = {"PERFORMANCE_HINT": "LATENCY"}
+            if precision == "int8":
+                print("int8 is only prepared for ONNX Runtime, OpenVINO runs the fp32 export.")
+                precision = "fp32"
+            config["INFERENCE_PRECISION_HINT"] = "f16" if precision == "fp16" else "f32"
+            if threads:
+                config["INFERENCE_NUM_THREADS"] = threads
+            self.compiled = ov.Core().compile_model(onnx_path, "CPU", config)
+            self.request = self.compiled.create_infer_request()
+        else:
+            raise Exception(f"Unknown runtime: {runtime}")
+
+    def _letterbox(self, frame, index):
+        # Resize keeping aspect ratio into the square input, padded with grey like the training pipeline
+        h, w = frame.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        nw, nh = max(1, round(w * ratio)), max(1, round(h * ratio))
+        left, top = (self.imgsz - nw) // 2, (self.imgsz - nh) // 2
+        canvas = self.batch[index]
+        canvas.fill(114)
+        canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)[..., ::-1]
+        return ratio, left, top
+
+    def _run(self, blob):
+        if self.runtime == "onnxruntime":
+            return self.session.run(None, {self.input_name: blob})[0]
+        return self.request.infer({0: blob})[self.compiled.output(0)]
+
+    def __call__(self, frames, verbose=False):
+        if not isinstance(frames, (list, tuple)):
+            frames = [frames]
+        # The uint8 letterbox buffer is kept between calls of the same batch size
+        if self.batch is None or len(self.batch) != len(frames):
+            self.batch = np.empty((len(frames), self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        transforms = [self._letterbox(frame, i) for i, frame in enumerate(frames)]
+        blob = self.batch.transpose(0, 3, 1, 2).astype(np.float32) * (1 / 255.0)
+        output = self._run(np.ascontiguousarray(blob))
+        return [self._decode(prediction, transform, frame.shape[:2])
+                for prediction, transform, frame in zip(output, transforms, frames)]
+
+    def _decode(self, prediction, transform, shape):
+        prediction = prediction.T  # (anchors, 4 + classes)
+        scores = prediction[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= self.conf
+        boxes, conf, cls = prediction[keep, :4], conf[keep], cls[keep]
+        if len(boxes) == 0:
+            return DetectionResult(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.float32))
+        # cx, cy, w, h in letterbox pixels -> x, y, w, h for NMS
+        xywh = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        indices = np.array(cv2.dnn.NMSBoxesBatched(xywh.tolist(), conf.tolist(), cls.tolist(), self.conf, self.iou), dtype=int).reshape(-1)
+        ratio, left, top = transform
+        xywh, conf, cls = xywh[indices], conf[indices], cls[indices]
+        xyxy = np.column_stack([xywh[:, 0] - left, xywh[:, 1] - top,
+                                xywh[:, 0] + xywh[:, 2] - left, xywh[:, 1] + xywh[:, 3] - top]) / ratio
+        h, w = shape
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+        return DetectionResult(xyxy.astype(np.float32), conf.astype(np.float32), cls.astype(np.float32))
+
+    def warmup(self, height=640, width=640, batch_sizes=(1,)):
+        # First runs allocate buffers and pick kernels, get that out of the way before real frames arrive
+        for size in batch_sizes:
+            self([np.zeros((height, width, 3), dtype=np.uint8)] * size)
+
+### One entry point for every runtime, also used by the inference worker processes
+def load_detector(model_path, runtime="pytorch", precision="fp32", threads=0, imgsz=640, warmup_shape=(640, 640), warmup_batches=(1,)):
+    if runtime not in RUNTIMES:
+        raise Exception(f"Unknown runtime: {runtime}")
+    if precision not in PRECISIONS:
+        raise Exception(f"Unknown precision: {precision}")
+    runtime, note = resolve_runtime(runtime)
+    if note:
+        print(note)
+    if runtime == "pytorch":
+        import torch
+        from ultralytics import YOLO
+        if threads:
+            torch.set_num_threads(threads)
+        model = YOLO(model_path)
+        for size in warmup_batches:
+            model([np.zeros(warmup_shape + (3,), dtype=np.uint8)] * size, verbose=False)
+        return model
+
+    # int8 is a quantized ONNX Runtime graph, OpenVINO takes the fp32 export and applies its own precision hint
+    onnx_path, names = export_cached(model_path, imgsz, precision if runtime == "onnxruntime" else "fp32")
+    detector = ExportedDetector(onnx_path, names, runtime, precision, threads, imgsz)
+    detector.warmup(*warmup_shape, batch_sizes=warmup_batches)
+    return detector
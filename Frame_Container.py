@@ -0,0 +1,158 @@
+import os
+import io
+import re
+import sys
+import csv
+import argparse
+from threading import Lock
+import numpy as np
+from PIL import Image
+
+### Packed frame container: every frame is a JPEG appended to one data file, with a CSV index next to it
+### (<path>.idx) holding each frame's byte offset, length, capture times and change score. One file per
+### session instead of one per frame, and frames can be pulled back out without decoding the others.
+INDEX_SUFFIX = ".idx"
+INDEX_FIELDS = ["offset", "length", "frame_time", "wall_time", "change_score"]
+
+class FrameContainerWriter:
+    # Append-only and safe to share between encoder threads. Reopening an existing container keeps appending.
+    # The data is written before its index line, so a crash can at worst leave unindexed bytes at the end.
+    def __init__(self, path, flush_every=32):
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = Lock()
+        self.data_file = open(path, "ab")
+        self.offset = self.data_file.seek(0, os.SEEK_END)
+        index_path = path + INDEX_SUFFIX
+        new_index = not os.path.exists(index_path) or os.path.getsize(index_path) == 0
+        self.index_file = open(index_path, "a", newline="")
+        if new_index:
+            self.index_file.write(",".join(INDEX_FIELDS) + "\n")
+        self.pending = 0
+        self.frames = 0
+
+    def append(self, data, frame_time, wall_time, change_score=None):
+        with self.lock:
+            offset = self.offset
+            self.data_file.write(data)
+            self.offset += len(data)
+            score = "" if change_score is None else f"{change_score:.3f}"
+            self.index_file.write(f"{offset},{len(data)},{frame_time:.6f},{wall_time:.6f},{score}\n")
+            self.frames += 1
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        self.data_file.flush()
+        self.index_file.flush()
+        self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.data_file.close()
+            self.index_file.close()
+
+def encode_jpeg(img, quality=90):
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+class FrameContainerReader:
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        data_size = os.path.getsize(path)
+        with open(path + INDEX_SUFFIX, newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    entry = {"offset": int(row["offset"]), "length": int(row["length"]),
+                             "frame_time": float(row["frame_time"]), "wall_time": float(row["wall_time"]),
+                             "change_score": float(row["change_score"]) if row["change_score"] else None}
+                except (TypeError, ValueError):
+                    continue  # Torn last line from an interrupted session
+                if entry["offset"] + entry["length"] <= data_size:
+                    self.entries.append(entry)
+        # Encoder threads append in whatever order they finish, the index is read back in capture order
+        self.entries.sort(key=lambda e: (e["wall_time"], e["frame_time"]))
+        self.data_file = open(path, "rb")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def read_bytes(self, entry):
+        self.data_file.seek(entry["offset"])
+        return self.data_file.read(entry["length"])
+
+    def read_frame(self, entry):
+        with Image.open(io.BytesIO(self.read_bytes(entry))) as img:
+            return np.asarray(img.convert("RGB"))
+
+    def close(self):
+        self.data_file.close()
+
+### Picking which frames to keep, only the chosen ones are ever read back
+def sample_entries(entries, stride=None, every_seconds=None, min_score=None, start=None, end=None):
+    # Filters apply in order: time range, change score, then one frame per every_seconds, then every stride-th
+    selected = [e for e in entries if (start is None or e["wall_time"] - entries[0]["wall_time"] >= start)
+                and (end is None or e["wall_time"] - entries[0]["wall_time"] <= end)] if entries else []
+    if min_score is not None:
+        selected = [e for e in selected if e["change_score"] is None or e["change_score"] >= min_score]
+    if every_seconds:
+        kept = []
+        next_time = None
+        for e in selected:
+            if next_time is None or e["wall_time"] >= next_time:
+                kept.append(e)
+                next_time = e["wall_time"] + every_seconds
+        selected = kept
+    if stride and stride > 1:
+        selected = selected[::stride]
+    return selected
+
+def next_image_index(folder):
+    # One past the highest img_<n>.jpg already in folder, the same way the capture picks its first index
+    pattern = re.compile(r"img_(\d+)\.jpg$")
+    next_index = 0
+    with os.scandir(folder) as entries:
+        for e in entries:
+            match = pattern.match(e.name)
+            if match:
+                next_index = max(next_index, int(match.group(1)) + 1)
+    return next_index
+
+def extract_frames(container_path, output_folder, stride=None, every_seconds=None, min_score=None, start=None, end=None, start_index=None):
+    # Writes the stored JPEG bytes of the sampled frames straight to img_<n>.jpg, no decode or re-encode.
+    # Numbering continues after the images already in output_folder unless start_index is given.
+    os.makedirs(output_folder, exist_ok=True)
+    if start_index is None:
+        start_index = next_image_index(output_folder)
+    reader = FrameContainerReader(container_path)
+    try:
+        selected = sample_entries(reader.entries, stride, every_seconds, min_score, start, end)
+        for i, entry in enumerate(selected):
+            with open(os.path.join(output_folder, f"img_{start_index + i}.jpg"), "wb") as f:
+                f.write(reader.read_bytes(entry))
+        return len(selected), len(reader)
+    finally:
+        reader.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract frames from a packed screenshot recording.")
+    parser.add_argument("container", help="recording .frames file")
+    parser.add_argument("output_folder")
+    parser.add_argument("--stride", type=int, help="keep every Nth frame")
+    parser.add_argument("--every", type=float, help="keep at most one frame per this many seconds")
+    parser.add_argument("--min-score", type=float, help="keep frames whose change score vs the previous frame is at least this")
+    parser.add_argument("--start", type=float, help="seconds into the recording to start from")
+    parser.add_argument("--end", type=float, help="seconds into the recording to stop at")
+    parser.add_argument("--start-index", type=int, help="number of the first written img_<n>.jpg (default: after the highest one already there)")
+    args = parser.parse_args()
+
+    kept, total = extract_frames(args.container, args.output_folder, args.stride, args.every, args.min_score,
+                                 args.start, args.end, args.start_index)
+    print(f"Extracted {kept} of {total} frames to {args.output_folder}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,156 @@
 import os
+import math
+import numpy as np
+import cv2
 from PIL import Image
+import torch
 import torchvision.transforms as transforms
 import tkinter as tk
 from tkinter import filedialog
 import random
+import multiprocessing
+import queue
+import threading
+import time
+import io
+import json
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+### Bounded-memory LRU cache of decoded source images
+class DecodedImageCache:
+    # storage="rgb" keeps plain interleaved uint8 pixels, storage="yuv420" keeps uint8 planes with
+    # half-resolution chroma (1.5 bytes per pixel instead of 3). downscale > 1 also shrinks what is
+    # stored, JPEGs are then decoded straight at the smaller size.
+    # Each process has its own cache, so the byte budget applies per worker.
+    def __init__(self, max_bytes=1024 ** 3, storage="rgb", downscale=1):
+        if storage not in ("rgb", "yuv420"):
+            raise ValueError("Cache storage must be 'rgb' or 'yuv420'.")
+        self.max_bytes = max_bytes
+        self.storage = storage
+        self.downscale = max(1, int(downscale))
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._entries = OrderedDict()  # path -> (mtime_ns, pixels, stored_size, source_size)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # Worker processes start with an empty cache of their own rather than a copy of this one
+        return {"max_bytes": self.max_bytes, "storage": self.storage, "downscale": self.downscale}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self.current_bytes,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def get(self, img_path):
+        # Keyed by path + modification time, an edited file counts as a miss and replaces the old entry
+        mtime_ns = os.stat(img_path).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(img_path)
+            if entry is not None and entry[0] == mtime_ns:
+                self._entries.move_to_end(img_path)
+                self.hits += 1
+                return self._to_image(entry)
+            self.misses += 1
+
+        # Decode outside the lock so other threads can keep hitting the cache meanwhile
+        entry = (mtime_ns,) + self._decode(img_path)
+        nbytes = entry[1].nbytes
+        with self._lock:
+            old = self._entries.pop(img_path, None)
+            if old is not None:
+                self.current_bytes -= old[1].nbytes
+            if nbytes <= self.max_bytes:
+                self._entries[img_path] = entry
+                self.current_bytes += nbytes
+                while self.current_bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted[1].nbytes
+                    self.evictions += 1
+        return self._to_image(entry)
+
+    def _decode(self, img_path):
+        with Image.open(img_path) as img:
+            source_size = img.size
+            if self.downscale > 1:
+                target = (max(1, source_size[0] // self.downscale), max(1, source_size[1] // self.downscale))
+                img.draft("RGB", target)
+                img = img.convert("RGB").resize(target, Image.Resampling.BILINEAR)
+            else:
+                img = img.convert("RGB")
+            pixels = np.asarray(img)
+
+        stored_size = (pixels.shape[1], pixels.shape[0])
+        if self.storage == "yuv420":
+            # I420 needs even dimensions, pad by repeating the last row/column and crop it off again on the way out
+            pad_h, pad_w = pixels.shape[0] % 2, pixels.shape[1] % 2
+            if pad_h or pad_w:
+                pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2YUV_I420)
+        return pixels, stored_size, source_size
+
+    def _to_image(self, entry):
+        _, pixels, stored_size, source_size = entry
+        if self.storage == "yuv420":
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_YUV2RGB_I420)[:stored_size[1], :stored_size[0]]
+            image = Image.fromarray(np.ascontiguousarray(pixels))
+        else:
+            # fromarray shares the cached buffer read-only, PIL copies it first if anything writes to the image
+            image = Image.fromarray(pixels)
+        image.info["source_size"] = source_size
+        return image
 
 ### Define the ImageDataset class to handle image loading and transformations
 class ImageDataset:
-    def __init__(self, file_list, transform=None):
+    def __init__(self, file_list, transform=None, reduced_decode=False, cache=None):
         self.file_list = file_list
         self.transform = transform
+        self.reduced_decode = reduced_decode
+        self.cache = cache
 
     def __len__(self):
         return len(self.file_list)
 
+    @property
+    def decodes_per_sample(self):
+        # With a cache the decoded image is already in memory, so reduced decoding is skipped
+        return self.reduced_decode and self.cache is None and self.transform is not None
+
+    def load_image(self, idx):
+        if self.cache is not None:
+            return self.cache.get(self.file_list[idx])
+        return Image.open(self.file_list[idx]).convert("RGB")
+
     def __getitem__(self, idx):
         img_path = self.file_list[idx]
-        image = Image.open(img_path).convert("RGB")
+        if self.decodes_per_sample:
+            return reduced_decode_transform(img_path, self.transform), img_path
+        image = self.load_image(idx)
         if self.transform:
             image = self.transform(image)
         return image, img_path
 
 ### Define the transformation pipelines without resizing
-def random_color_jitter():
+def random_jitter_strengths():
     brightness = random.uniform(0.1, 0.3)
     contrast = random.uniform(0.1, 0.3)
     saturation = random.uniform(0.1, 0.3)
+    return brightness, contrast, saturation
+
+def random_color_jitter():
+    brightness, contrast, saturation = random_jitter_strengths()
     return transforms.ColorJitter(brightness=brightness, contrast=contrast, saturation=saturation)
 
 def get_transform(pipeline_type):
@@ -45,37 +170,709 @@ def get_transform(pipeline_type):
     else:
         raise ValueError("Invalid pipeline type")
 
+### Resampling filters selectable for the uint8 pipelines and the final resize (PIL filter, OpenCV flag)
+RESAMPLING_FILTERS = {
+    "nearest": (Image.Resampling.NEAREST, cv2.INTER_NEAREST),
+    "bilinear": (Image.Resampling.BILINEAR, cv2.INTER_LINEAR),
+    "bicubic": (Image.Resampling.BICUBIC, cv2.INTER_CUBIC),
+    "area": (Image.Resampling.BOX, cv2.INTER_AREA),
+    "lanczos": (Image.Resampling.LANCZOS, cv2.INTER_LANCZOS4),
+}
+
+def _cv2_interpolation(resample, src_size, dst_size):
+    # "auto" picks INTER_AREA when shrinking, which is the closest match to PIL's antialiased
+    # bilinear resize used by torchvision, and plain bilinear when enlarging
+    if resample == "auto":
+        shrinking = dst_size[0] < src_size[0] or dst_size[1] < src_size[1]
+        return cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+    return RESAMPLING_FILTERS[resample][1]
+
+### Tensor-free uint8 versions of the get_transform pipelines
+class FastTransform:
+    def __init__(self, size=(178, 178), scale=(0.08, 1.0), ratio=(3 / 4, 4 / 3), flip_p=0.5, jitter=None, resample="auto"):
+        self.size = size  # (height, width), same order as RandomResizedCrop
+        self.scale = scale
+        self.ratio = ratio
+        self.flip_p = flip_p
+        self.jitter = jitter  # (brightness, contrast, saturation) strengths or None
+        self.resample = resample
+
+    def __repr__(self):
+        # Also what the run manifest records as the transform parameters
+        return (f"FastTransform(size={self.size}, scale={self.scale}, ratio={self.ratio}, flip_p={self.flip_p}, "
+                f"jitter={self.jitter}, resample={self.resample!r})")
+
+    def get_crop_box(self, width, height, rng=None):
+        # Same sampling scheme as RandomResizedCrop.get_params, returns (top, left, h, w).
+        # rng is a random.Random to draw from instead of the global random module.
+        rng = rng or random
+        area = height * width
+        log_ratio = (math.log(self.ratio[0]), math.log(self.ratio[1]))
+        for _ in range(10):
+            target_area = area * rng.uniform(self.scale[0], self.scale[1])
+            aspect_ratio = math.exp(rng.uniform(log_ratio[0], log_ratio[1]))
+
+            w = int(round(math.sqrt(target_area * aspect_ratio)))
+            h = int(round(math.sqrt(target_area / aspect_ratio)))
+
+            if 0 < w <= width and 0 < h <= height:
+                top = rng.randint(0, height - h)
+                left = rng.randint(0, width - w)
+                return top, left, h, w
+
+        # Fallback to central crop
+        in_ratio = float(width) / float(height)
+        if in_ratio < min(self.ratio):
+            w = width
+            h = int(round(w / min(self.ratio)))
+        elif in_ratio > max(self.ratio):
+            h = height
+            w = int(round(h * max(self.ratio)))
+        else:
+            w = width
+            h = height
+        return (height - h) // 2, (width - w) // 2, h, w
+
+    def crop_and_resize(self, img, box):
+        top, left, h, w = box
+        out_h, out_w = self.size
+        region = img[top:top + h, left:left + w]
+        return cv2.resize(region, (out_w, out_h), interpolation=_cv2_interpolation(self.resample, (w, h), (out_w, out_h)))
+
+    def __call__(self, image, rng=None):
+        img = np.asarray(image)
+        img = self.crop_and_resize(img, self.get_crop_box(img.shape[1], img.shape[0], rng))
+        return self.finish(img, rng)
+
+    def finish(self, img, rng=None):
+        # Everything after the crop, also used when the crop was already done while decoding
+        rng = rng or random
+        if rng.random() < self.flip_p:
+            img = cv2.flip(img, 1)
+        if self.jitter:
+            img = self.color_jitter(img, rng)
+        return img
+
+    def color_jitter(self, img, rng=None):
+        rng = rng or random
+        # ColorJitter applies its adjustments in a random order, each with a factor drawn from [1 - s, 1 + s]
+        adjustments = [self.adjust_brightness, self.adjust_contrast, self.adjust_saturation]
+        strengths = list(self.jitter)
+        order = list(range(3))
+        rng.shuffle(order)
+        for k in order:
+            factor = rng.uniform(max(0.0, 1 - strengths[k]), 1 + strengths[k])
+            img = adjustments[k](img, factor)
+        return img
+
+    @staticmethod
+    def adjust_brightness(img, factor):
+        lut = np.clip(np.arange(256) * factor, 0, 255).astype(np.uint8)
+        return cv2.LUT(img, lut)
+
+    @staticmethod
+    def adjust_contrast(img, factor):
+        # Blend towards the mean grey level like PIL's ImageEnhance.Contrast
+        mean = int(cv2.cvtColor(img, cv2.COLOR_RGB2GRAY).mean() + 0.5)
+        lut = np.clip(mean + (np.arange(256) - mean) * factor, 0, 255).astype(np.uint8)
+        return cv2.LUT(img, lut)
+
+    @staticmethod
+    def adjust_saturation(img, factor):
+        # Blend with the per-pixel grey value, addWeighted stays in uint8 and saturates.
+        # The -0.5 turns its rounding into the truncation PIL uses, the LUTs above truncate too
+        gray = cv2.cvtColor(cv2.cvtColor(img, cv2.COLOR_RGB2GRAY), cv2.COLOR_GRAY2RGB)
+        return cv2.addWeighted(img, factor, gray, 1 - factor, -0.5)
+
+def get_fast_transform(pipeline_type, resample="auto"):
+    if pipeline_type == "original":
+        return FastTransform(size=(178, 178), resample=resample)
+    elif pipeline_type == "color_manipulation":
+        return FastTransform(size=(178, 178), jitter=random_jitter_strengths(), resample=resample)
+    else:
+        raise ValueError("Invalid pipeline type")
+
+### Scale-aware decode: pick the crop box first, then let the JPEG decoder downscale in the DCT domain
+def decode_for_crop(img_path, out_size, pick_box, resample=Image.Resampling.BILINEAR):
+    # out_size is (height, width) like RandomResizedCrop, pick_box gets the unloaded image and returns (top, left, h, w)
+    out_h, out_w = out_size
+    with Image.open(img_path) as img:
+        width, height = img.size
+        top, left, h, w = pick_box(img)
+
+        # draft() picks the largest 1/2, 1/4 or 1/8 JPEG scale that keeps the image at least this big,
+        # so the crop still has at least out_size pixels. Other formats ignore it and decode in full.
+        shrink = min(w / out_w, h / out_h)
+        if shrink > 1:
+            img.draft("RGB", (math.ceil(width / shrink), math.ceil(height / shrink)))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        sx = img.size[0] / width
+        sy = img.size[1] / height
+        box = (left * sx, top * sy, (left + w) * sx, (top + h) * sy)
+        return img.resize((out_w, out_h), resample, box=box)
+
+def reduced_decode_transform(img_path, transform, rng=None):
+    # Run a pipeline that starts with a random resized crop, doing the crop as part of the decode.
+    # rng (a random.Random) only applies to FastTransform, torchvision pipelines use the torch RNG.
+    if isinstance(transform, FastTransform):
+        resample = Image.Resampling.BILINEAR if transform.resample == "auto" else RESAMPLING_FILTERS[transform.resample][0]
+        image = decode_for_crop(img_path, transform.size, lambda img: transform.get_crop_box(*img.size, rng), resample)
+        return transform.finish(np.asarray(image), rng)
+
+    steps = transform.transforms if isinstance(transform, transforms.Compose) else [transform]
+    if not steps or not isinstance(steps[0], transforms.RandomResizedCrop):
+        # Nothing to crop up front, fall back to a full decode
+        return transform(Image.open(img_path).convert("RGB"))
+
+    crop = steps[0]
+    resample = getattr(Image.Resampling, crop.interpolation.value.upper(), Image.Resampling.BILINEAR)
+    # get_params only reads the image size, so the crop box comes from the same torch RNG draws as a full decode
+    image = decode_for_crop(img_path, crop.size, lambda img: transforms.RandomResizedCrop.get_params(img, crop.scale, crop.ratio), resample)
+    for step in steps[1:]:
+        image = step(image)
+    return image
+
+def measure_reduced_decode(file_list, transform, repeats=3):
+    # Time a full decode + transform against the reduced decode path over the same files, in ms per image
+    def run(reduced):
+        dataset = ImageDataset(file_list, transform=transform, reduced_decode=reduced)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for i in range(len(dataset)):
+                dataset[i]
+        return (time.perf_counter() - start) * 1000 / (repeats * len(dataset))
+
+    full_ms = run(False)
+    reduced_ms = run(True)
+    return {"full_decode_ms": full_ms, "reduced_decode_ms": reduced_ms, "speedup": full_ms / reduced_ms}
+
+### Streaming augmentation that feeds a training loop directly, nothing is written to disk
+class AugmentationStream(torch.utils.data.IterableDataset):
+    # Background threads keep resampling random source images through the transform into a bounded queue.
+    # Decoding and the image kernels release the GIL, so threads are enough here. Use it with
+    # DataLoader(num_workers=0), the stream already prefetches on its own.
+    # With a seed every sample gets its own seed and samples come out in order. The source picks and the
+    # numpy FastTransform pipelines then draw from a private random.Random per sample, so a seeded stream is
+    # reproducible and never touches the global RNGs of the training loop. torchvision pipelines can only
+    # draw from the global torch RNG, for those the seed fixes which images are picked but not their
+    # augmentations.
+    def __init__(self, file_list, transform, num_workers=2, queue_size=64, seed=None, samples_per_epoch=None, reduced_decode=False, cache=None):
+        if not file_list:
+            raise ValueError("No images to stream from.")
+        self.dataset = ImageDataset(file_list, transform=transform, reduced_decode=reduced_decode, cache=cache)
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.seed = seed
+        self.samples_per_epoch = samples_per_epoch  # None streams forever
+        self.epoch = 0
+
+    def _seeded_sample(self, base_seed, sample_number):
+        # Source pick and augmentation both follow from the sample number, whichever thread gets it
+        rng = random.Random(random.Random(f"{base_seed}-{self.epoch}-{sample_number}").getrandbits(32))
+        idx = rng.randrange(len(self.dataset))
+        transform = self.dataset.transform
+        if not isinstance(transform, FastTransform):
+            return self.dataset[idx]
+        img_path = self.dataset.file_list[idx]
+        if self.dataset.decodes_per_sample:
+            return reduced_decode_transform(img_path, transform, rng), img_path
+        return transform(self.dataset.load_image(idx), rng), img_path
+
+    def __iter__(self):
+        samples = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        seeded = self.seed is not None
+        base_seed = self.seed if seeded else random.randrange(2 ** 32)
+        next_number = iter(range(2 ** 62))
+        number_lock = threading.Lock()
+
+        def put(item):
+            # Blocks while the queue is full, which is the backpressure on the workers
+            while not stop.is_set():
+                try:
+                    samples.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def worker(worker_id):
+            rng = random.Random(f"{base_seed}-{worker_id}")
+            try:
+                while not stop.is_set():
+                    if seeded:
+                        with number_lock:
+                            number = next(next_number)
+                        put(("sample", number, self._seeded_sample(base_seed, number)))
+                    else:
+                        put(("sample", None, self.dataset[rng.randrange(len(self.dataset))]))
+            except Exception as e:
+                put(("error", None, e))
+
+        threads = [threading.Thread(target=worker, args=(k,), daemon=True) for k in range(max(1, self.num_workers))]
+        for t in threads:
+            t.start()
+
+        try:
+            produced = 0
+            waiting = {}  # Seeded samples that finished ahead of an earlier one
+            while self.samples_per_epoch is None or produced < self.samples_per_epoch:
+                if seeded and produced in waiting:
+                    item = waiting.pop(produced)
+                else:
+                    kind, number, item = samples.get()
+                    if kind == "error":
+                        raise item
+                    if seeded and number != produced:
+                        waiting[number] = item
+                        continue
+                yield item
+                produced += 1
+        finally:
+            # Runs when the epoch ends or the consumer stops iterating early
+            stop.set()
+            for t in threads:
+                t.join()
+            self.epoch += 1
+
+### Per-stage timing, summed across threads and worker processes
+class StageTimer:
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def merge(self, totals):
+        for stage, seconds in totals.items():
+            self.add(stage, seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.totals)
+
+### Output encoding settings for the augmented images
+OUTPUT_FORMATS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+def get_save_options(output_format="jpeg", quality=75, optimize=False, compress_level=6):
+    # quality applies to JPEG and WebP, compress_level (0-9) to PNG. The defaults match a plain PIL save().
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return {"format": output_format, "quality": quality, "optimize": optimize, "compress_level": compress_level}
+
+def encode_image(image, save_options):
+    buffer = io.BytesIO()
+    if save_options["format"] == "png":
+        image.save(buffer, format="PNG", optimize=save_options["optimize"], compress_level=save_options["compress_level"])
+    elif save_options["format"] == "webp":
+        image.save(buffer, format="WEBP", quality=save_options["quality"])
+    else:
+        image.save(buffer, format="JPEG", quality=save_options["quality"], optimize=save_options["optimize"])
+    return buffer.getvalue()
+
+### Writer stage: a bounded queue drained by encoder threads (PIL's encoders release the GIL)
+class AsyncImageWriter:
+    def __init__(self, save_options=None, num_threads=4, queue_size=32, timer=None):
+        self.save_options = save_options or get_save_options()
+        self.timer = timer or StageTimer()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._errors = []
+        self._completed = []
+        self._completed_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, num_threads))]
+        for t in self._threads:
+            t.start()
+
+    @property
+    def extension(self):
+        return OUTPUT_FORMATS[self.save_options["format"]]
+
+    def submit(self, image, path, record=None):
+        # Blocks when the queue is full, that wait is reported as "writer_wait" (backpressure on the compute loop).
+        # record is handed back through take_completed() once the file is fully on disk.
+        if self._errors:
+            raise self._errors[0]
+        with self.timer.time("writer_wait"):
+            self._queue.put((image, path, record))
+
+    def take_completed(self):
+        with self._completed_lock:
+            completed, self._completed = self._completed, []
+        return completed
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                image, path, record = item
+                with self.timer.time("encode"):
+                    data = encode_image(image, self.save_options)
+                with self.timer.time("write"):
+                    # Write to a temporary name and rename, so a crash never leaves a half-written image behind
+                    tmp_path = path + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                if record is not None:
+                    with self._completed_lock:
+                        self._completed.append(record)
+            except Exception as e:
+                self._errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        # Wait until everything submitted so far is on disk
+        self._queue.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def close(self):
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+### Run manifest: which samples of which configuration already exist in the output folder
+MANIFEST_NAME = "augmentation_manifest.jsonl"
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class RunManifest:
+    # Append-only JSON lines in the output folder. "source" lines remember content hashes so unchanged
+    # files aren't re-read, "config" lines describe a run configuration, and "sample" lines are written
+    # once an output image is fully on disk. "run" / "run_done" lines bracket each run, so the seed of a run
+    # that never finished can be picked up again. A torn last line from a crash is ignored on load.
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.sources = {}    # path -> (size, mtime_ns, hash)
+        self.configs = set()
+        self.samples = {}    # (config hash, sample key) -> output file name
+        self.unfinished_seed = None  # Seed of the last run that started but never finished
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("type") == "source":
+                        self.sources[entry["path"]] = (entry["size"], entry["mtime_ns"], entry["hash"])
+                    elif entry.get("type") == "config":
+                        self.configs.add(entry["config"])
+                    elif entry.get("type") == "sample":
+                        self.samples[(entry["config"], entry["key"])] = entry["output"]
+                    elif entry.get("type") == "run":
+                        self.unfinished_seed = entry["seed"]
+                    elif entry.get("type") == "run_done":
+                        self.unfinished_seed = None
+        self._file = open(self.path, "a", encoding="utf-8")
+        # Terminate a torn last line so the next entry starts on a line of its own
+        if self._file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+
+    def source_hash(self, path):
+        st = os.stat(path)
+        known = self.sources.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        digest = _file_hash(path)
+        self.sources[path] = (st.st_size, st.st_mtime_ns, digest)
+        self._append({"type": "source", "path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest})
+        return digest
+
+    def add_config(self, config_hash, config):
+        if config_hash not in self.configs:
+            self.configs.add(config_hash)
+            self._append({"type": "config", "config": config_hash, **config})
+            self.flush()
+
+    def start_run(self, config_hash, seed, num_samples):
+        self._append({"type": "run", "config": config_hash, "seed": seed, "samples": num_samples})
+        self.flush()
+
+    def finish_run(self, config_hash):
+        self._append({"type": "run_done", "config": config_hash})
+        self.flush()
+
+    def is_done(self, config_hash, key, output_folder):
+        output = self.samples.get((config_hash, key))
+        return output is not None and os.path.exists(os.path.join(output_folder, output))
+
+    def add_samples(self, records):
+        for record in records:
+            self.samples[(record["config"], record["key"])] = record["output"]
+            self._append({"type": "sample", **record})
+        self.flush()
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+def unfinished_run_seed(output_folder):
+    # Seed of an interrupted run in this output folder, or None. Reusing it lets a re-run without a seed
+    # resume where the crash left off instead of starting a fresh run with a new seed.
+    if not os.path.exists(os.path.join(output_folder, MANIFEST_NAME)):
+        return None
+    manifest = RunManifest(output_folder)
+    manifest.close()
+    return manifest.unfinished_seed
+
+def _run_config(transform, seed, output_options, reduced_decode, cache):
+    # Everything that changes the pixels of an output image, hashed into the config id
+    config = {
+        "transform": repr(transform),
+        "seed": seed,
+        "output_size": output_options["output_size"],
+        "resample": output_options["resample"],
+        "save_options": output_options["save_options"],
+        "reduced_decode": reduced_decode,
+        "cache": cache.__getstate__() if cache is not None and cache.downscale > 1 else None,
+    }
+    config_hash = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+    return config_hash, config
+
 ### Function to perform data augmentation
-def augment_images(input_folder, output_folder, transform, num_samples):
+def augment_images(input_folder, output_folder, transform, num_samples, num_workers=1, seed=None, chunk_size=16, progress_callback=None, variants_per_image=None, output_size="original", resample="lanczos", reduced_decode=False, cache=None, save_options=None, writer_threads=4, writer_queue_size=32, resume=True):
     # Collect all image file paths in the input folder
     file_list = [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    if not file_list:
+        raise ValueError("No images found in the input folder.")
+
+    # Work out how many variants to generate from each decoded source image.
+    # Asking for more samples than there are images switches to fan-out automatically.
+    if variants_per_image is None:
+        variants_per_image = -(-num_samples // len(file_list))
+    if variants_per_image < 1:
+        raise ValueError("Variants per image must be at least 1.")
+    num_sources = -(-num_samples // variants_per_image)
     
     # Ensure we have enough images to sample from
-    if num_samples > len(file_list):
-        raise ValueError(f"Not enough images in the input folder ({len(file_list)}). Cannot generate {num_samples} samples.")
+    if num_sources > len(file_list):
+        raise ValueError(f"Not enough images in the input folder ({len(file_list)}). Cannot generate {num_samples} samples with {variants_per_image} variants per image.")
     
-    # Randomly sample image paths
-    sampled_paths = random.sample(file_list, num_samples)
+    if output_size not in ("original", "crop"):
+        raise ValueError("Output size must be 'original' or 'crop'.")
+    if resample not in RESAMPLING_FILTERS:
+        raise ValueError(f"Unknown resampling filter: {resample}")
+    output_options = {"output_size": output_size, "resample": resample,
+                      "save_options": save_options or get_save_options(),
+                      "writer_threads": writer_threads, "writer_queue_size": writer_queue_size}
+
+    # Without a seed, pick up the seed of an interrupted run in this folder so it resumes, otherwise pick a
+    # new one. Either way the seed is in the manifest before any work starts, so every run can be reproduced.
+    if seed is None:
+        seed = unfinished_run_seed(output_folder)
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    # Randomly pick the source images by ranking file names on a seeded hash. Unlike random.sample this
+    # stays stable when images are added to the folder, so a re-run keeps most of its earlier picks.
+    sampled_paths = sorted(file_list, key=lambda p: hashlib.sha1(f"{seed}:{os.path.basename(p)}".encode()).hexdigest())[:num_sources]
     
     # Create output folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
 
-    dataset = ImageDataset(sampled_paths, transform=transform)
-    
-    # Perform transformations and save augmented images
-    for i in range(len(dataset)):
-        img_tensor, original_img_path = dataset[i]
-        transformed_img = transforms.ToPILImage()(img_tensor)
-        
-        # Resize the transformed image to match the original image size
-        with Image.open(original_img_path) as img:
+    dataset = ImageDataset(sampled_paths, transform=transform, reduced_decode=reduced_decode, cache=cache)
+    manifest = RunManifest(output_folder)
+    try:
+        config_hash, config = _run_config(transform, seed, output_options, reduced_decode, cache)
+        manifest.add_config(config_hash, config)
+        manifest.start_run(config_hash, seed, num_samples)
+        extension = OUTPUT_FORMATS[output_options["save_options"]["format"]]
+
+        # Each work item is one source image and the variants it still has to produce. Samples are named and
+        # seeded by the source content hash, so they don't depend on worker count or on the rest of the folder,
+        # and anything the manifest already lists (with the file still there) is skipped.
+        work_items = []
+        skipped = 0
+        for j, path in enumerate(sampled_paths):
+            source_hash = manifest.source_hash(path)
+            variants = []
+            for k in range(min(variants_per_image, num_samples - j * variants_per_image)):
+                key = f"{source_hash}:{k}"
+                if resume and manifest.is_done(config_hash, key, output_folder):
+                    skipped += 1
+                    continue
+                sample_seed = _sample_seed(seed, source_hash, k)
+                output = f"augmented_{source_hash[:16]}_{k}_{config_hash[:8]}{extension}"
+                variants.append((sample_seed, output, {"config": config_hash, "key": key, "source": path, "source_hash": source_hash,
+                                                       "variant": k, "seed": sample_seed, "output": output}))
+            if variants:
+                work_items.append((j, variants))
+        manifest.flush()
+        to_do = num_samples - skipped
+
+        # Perform transformations and save augmented images
+        start = time.perf_counter()
+        timer = StageTimer()
+        if num_workers <= 1:
+            writer = _make_writer(output_options, timer)
+            done = skipped
+            try:
+                for source_index, variants in work_items:
+                    _augment_source(dataset, source_index, variants, output_folder, output_options, writer, timer)
+                    # Progress counts what the writer has actually finished
+                    completed = writer.take_completed()
+                    manifest.add_samples(completed)
+                    done += len(completed)
+                    if progress_callback:
+                        progress_callback(done, num_samples)
+            finally:
+                writer.close()
+                manifest.add_samples(writer.take_completed())
+                if progress_callback:
+                    progress_callback(num_samples, num_samples)
+        else:
+            _augment_parallel(dataset, work_items, output_folder, output_options, num_workers, max(1, chunk_size // variants_per_image),
+                              progress_callback, timer, manifest, skipped, num_samples)
+        manifest.finish_run(config_hash)
+    finally:
+        manifest.close()
+
+    report = _run_report(seed, to_do, time.perf_counter() - start, timer.snapshot())
+    report["skipped"] = skipped
+    return report
+
+def _run_report(seed, num_samples, wall_time, stages):
+    # Stage times are summed over all threads and processes, so compare them as shares of the total work
+    augment_time = sum(stages.get(k, 0.0) for k in ("decode", "transform", "resize"))
+    encode_time = sum(stages.get(k, 0.0) for k in ("encode", "write"))
+    busy = augment_time + encode_time
+    return {
+        "seed": seed,
+        "samples": num_samples,
+        "wall_time": wall_time,
+        "images_per_sec": num_samples / wall_time if wall_time > 0 else 0.0,
+        "stages": stages,
+        "augment_share": augment_time / busy if busy else 0.0,
+        "encode_share": encode_time / busy if busy else 0.0,
+    }
+
+### Per-source work shared by the serial loop and the worker processes
+def _sample_seed(seed, source_hash, variant):
+    # Every sample gets its own seed derived from the run seed, its source content and its variant number,
+    # so the output is the same no matter which worker ends up processing it
+    return random.Random(f"{seed}-{source_hash}-{variant}").getrandbits(32)
+
+def _make_writer(output_options, timer):
+    return AsyncImageWriter(output_options["save_options"], num_threads=output_options["writer_threads"],
+                            queue_size=output_options["writer_queue_size"], timer=timer)
+
+def _augment_source(dataset, source_index, variants, output_folder, output_options, writer, timer):
+    pil_filter, _ = RESAMPLING_FILTERS[output_options["resample"]]
+    fast = isinstance(dataset.transform, FastTransform)
+
+    if dataset.decodes_per_sample:
+        # Every variant has its own crop box and decodes only what it needs, the header gives the size
+        image = None
+        with Image.open(dataset.file_list[source_index]) as img:
             original_size = img.size
-        
-        resized_transformed_img = transformed_img.resize(original_size, Image.Resampling.LANCZOS)
+    else:
+        # Decode the source once and reuse it for every variant (a downscaled cache entry remembers the real size)
+        with timer.time("decode"):
+            image = dataset.load_image(source_index)
+            original_size = image.info.get("source_size", image.size)
+            # The uint8 pipelines work on a NumPy view, convert once instead of once per variant
+            source = np.asarray(image) if fast else image
+
+    for sample_seed, output_name, record in variants:
+        random.seed(sample_seed)
+        torch.manual_seed(sample_seed)
+
+        if dataset.decodes_per_sample:
+            # Decoding and cropping happen together here, so the time counts as decode
+            with timer.time("decode"):
+                transformed, _ = dataset[source_index]
+        else:
+            with timer.time("transform"):
+                transformed = dataset.transform(source)
+
+        with timer.time("resize"):
+            if fast:
+                if output_options["output_size"] == "original":
+                    interpolation = _cv2_interpolation(output_options["resample"], (transformed.shape[1], transformed.shape[0]), original_size)
+                    transformed = cv2.resize(transformed, original_size, interpolation=interpolation)
+                output_img = Image.fromarray(transformed)
+            else:
+                output_img = transforms.ToPILImage()(transformed)
+
+                # Resize the transformed image to match the original image size
+                if output_options["output_size"] == "original":
+                    output_img = output_img.resize(original_size, pil_filter)
+
+        # Hand the augmented image to the writer stage
+        writer.submit(output_img, os.path.join(output_folder, output_name), record)
 
-        # Save the augmented image
-        output_file_path = os.path.join(output_folder, f'augmented_{i}.jpg')
-        resized_transformed_img.save(output_file_path)
+    if image is not None:
+        image.close()
+
+### Parallel engine: a process pool working through chunks of source images
+_worker_state = {}
+
+def _init_worker(dataset, output_folder, output_options):
+    # Each worker already runs in parallel with the others, so keep torch and OpenCV from spawning their own threads on top
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    _worker_state["dataset"] = dataset
+    _worker_state["output_folder"] = output_folder
+    _worker_state["output_options"] = output_options
+    _worker_state["timer"] = StageTimer()
+    _worker_state["writer"] = _make_writer(output_options, _worker_state["timer"])
+
+def _augment_chunk(items):
+    for source_index, variants in items:
+        _augment_source(_worker_state["dataset"], source_index, variants, _worker_state["output_folder"],
+                        _worker_state["output_options"], _worker_state["writer"], _worker_state["timer"])
+    # Only report the chunk once its images are on disk, and hand over the time spent on it
+    _worker_state["writer"].flush()
+    timer = _worker_state["timer"]
+    _worker_state["timer"] = StageTimer()
+    _worker_state["writer"].timer = _worker_state["timer"]
+    return _worker_state["writer"].take_completed(), timer.snapshot()
+
+def _augment_parallel(dataset, work_items, output_folder, output_options, num_workers, chunk_size, progress_callback, timer, manifest, skipped, num_samples):
+    chunks = [work_items[start:start + chunk_size] for start in range(0, len(work_items), chunk_size)]
+
+    # spawn matches what Windows does anyway and avoids forking a process that already has torch/Tk threads running
+    ctx = multiprocessing.get_context("spawn")
+    done = skipped
+    with ctx.Pool(processes=num_workers, initializer=_init_worker, initargs=(dataset, output_folder, output_options)) as pool:
+        for records, stages in pool.imap_unordered(_augment_chunk, chunks):
+            # Only the main process writes the manifest
+            manifest.add_samples(records)
+            done += len(records)
+            timer.merge(stages)
+            if progress_callback:
+                progress_callback(done, num_samples)
 
 ### Function to browse folders using Tkinter filedialog
 def browse_folder(entry):
@@ -83,60 +880,203 @@ def browse_folder(entry):
     entry.delete(0, tk.END)
     entry.insert(0, folder_path)
 
+### The GUI keeps one cache alive between runs, so re-running over the same folder skips decoding.
+### That only works with a single worker: worker processes each start with an empty cache that goes
+### away with the pool, and one run decodes every source only once, so it would never hit there.
+gui_cache = None
+
+def get_gui_cache(cache_mb):
+    global gui_cache
+    if cache_mb <= 0:
+        gui_cache = None
+    elif gui_cache is None or gui_cache.max_bytes != cache_mb * 1024 ** 2:
+        gui_cache = DecodedImageCache(max_bytes=cache_mb * 1024 ** 2)
+    return gui_cache
+
 ### Function to run the augmentation process
 def run_augmentation():
     input_folder = input_entry.get()
     output_folder = output_entry.get()
     pipeline_type = transform_var.get()
-    num_samples = int(num_samples_entry.get())
     
     if not os.path.exists(input_folder):
         result_label.config(text="Input folder does not exist!", fg='red')
         return
+
+    try:
+        num_samples = int(num_samples_entry.get())
+        num_workers = int(workers_entry.get())
+        seed = int(seed_entry.get()) if seed_entry.get().strip() else None
+        variants_per_image = int(variants_entry.get()) if variants_entry.get().strip() else None
+        cache_mb = int(cache_entry.get()) if cache_entry.get().strip() else 0
+        quality = int(quality_entry.get())
+    except ValueError:
+        result_label.config(text="Samples, workers, seed, variants, cache size and quality must be whole numbers!", fg='red')
+        return
     
+    # The seed also fixes the random jitter strengths, so re-running with the same seed
+    # matches the run manifest and only fills in what is missing. Without one, an interrupted
+    # run in the output folder is resumed with its seed.
+    resuming = False
+    if seed is None:
+        try:
+            seed = unfinished_run_seed(output_folder) if os.path.isdir(output_folder) else None
+        except OSError:
+            seed = None
+        resuming = seed is not None
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    random.seed(seed)
+
     try:
-        transform = get_transform(pipeline_type)
-        augment_images(input_folder, output_folder, transform, num_samples)
-        result_label.config(text="Augmentation completed successfully!", fg='green')
+        if backend_var.get() == "numpy":
+            transform = get_fast_transform(pipeline_type)
+        else:
+            transform = get_transform(pipeline_type)
     except ValueError as e:
         result_label.config(text=str(e), fg='red')
+        return
+
+    cache = get_gui_cache(cache_mb)
+    status = f"Resuming interrupted run with seed {seed}..." if resuming else f"Starting augmentation with seed {seed}..."
+    print(status)
+    if cache is not None and num_workers > 1:
+        cache = None
+        status += " (decoded image cache is only used with 1 worker, running without it)"
+        print("Decoded image cache disabled: it only persists between runs with 1 worker.")
+
+    # Run the augmentation on a background thread so the window stays responsive,
+    # the thread only talks to Tk through the progress queue
+    run_button.config(state=tk.DISABLED)
+    result_label.config(text=status, fg='black')
+    progress_queue = queue.Queue()
+
+    def worker():
+        try:
+            report = augment_images(input_folder, output_folder, transform, num_samples,
+                                       num_workers=num_workers, seed=seed, variants_per_image=variants_per_image,
+                                       output_size=output_size_var.get(), resample=resample_var.get(),
+                                       reduced_decode=bool(reduced_decode_var.get()), cache=cache,
+                                       save_options=get_save_options(format_var.get(), quality=quality),
+                                       progress_callback=lambda done, total: progress_queue.put(("progress", done, total)))
+            if cache is not None:
+                print(f"Decoded image cache: {cache.stats()}")
+            progress_queue.put(("done", report, None))
+        except Exception as e:
+            progress_queue.put(("error", str(e), None))
+
+    threading.Thread(target=worker, daemon=True).start()
+    root.after(100, poll_progress, progress_queue)
+
+def poll_progress(progress_queue):
+    while True:
+        try:
+            kind, a, b = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "progress":
+            result_label.config(text=f"Augmenting... {a}/{b}", fg='black')
+        elif kind == "done":
+            result_label.config(text=f"Augmentation completed in {a['wall_time']:.1f}s (seed {a['seed']}, {a['skipped']} already done): "
+                                     f"{a['augment_share']:.0%} augmenting, {a['encode_share']:.0%} encoding/writing", fg='green')
+            print(f"Stage times (s): {a['stages']}")
+            run_button.config(state=tk.NORMAL)
+            return
+        elif kind == "error":
+            result_label.config(text=a, fg='red')
+            run_button.config(state=tk.NORMAL)
+            return
+    root.after(100, poll_progress, progress_queue)
 
 ### Create the main window
-root = tk.Tk()
-root.title("Image Data Augmentation")
-
-# Input folder selection
-tk.Label(root, text="Input Folder:").grid(row=0, column=0, padx=10, pady=5)
-input_entry = tk.Entry(root, width=50)
-input_entry.grid(row=0, column=1, padx=10, pady=5)
-browse_input_button = tk.Button(root, text="Browse", command=lambda: browse_folder(input_entry))
-browse_input_button.grid(row=0, column=2, padx=10, pady=5)
-
-# Output folder selection
-tk.Label(root, text="Output Folder:").grid(row=1, column=0, padx=10, pady=5)
-output_entry = tk.Entry(root, width=50)
-output_entry.grid(row=1, column=1, padx=10, pady=5)
-browse_output_button = tk.Button(root, text="Browse", command=lambda: browse_folder(output_entry))
-browse_output_button.grid(row=1, column=2, padx=10, pady=5)
-
-# Transformation pipeline selection
-tk.Label(root, text="Transformation Pipeline:").grid(row=2, column=0, padx=10, pady=5)
-transform_var = tk.StringVar(value="original")
-pipeline_options = ["original", "color_manipulation"]
-for i, option in enumerate(pipeline_options):
-    tk.Radiobutton(root, text=option, variable=transform_var, value=option).grid(row=2, column=i+1)
-
-# Number of samples entry
-tk.Label(root, text="Number of Samples:").grid(row=3, column=0, padx=10, pady=5)
-num_samples_entry = tk.Entry(root, width=50)
-num_samples_entry.grid(row=3, column=1, padx=10, pady=5)
-
-# Run augmentation button
-run_button = tk.Button(root, text="Run Augmentation", command=run_augmentation)
-run_button.grid(row=4, column=0, columnspan=3, pady=20)
-
-# Result label
-result_label = tk.Label(root, text="")
-result_label.grid(row=5, column=0, columnspan=3)
-
-root.mainloop()
\ No newline at end of file
+# Only build the GUI when run as a script, worker processes import this module too
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("Image Data Augmentation")
+
+    # Input folder selection
+    tk.Label(root, text="Input Folder:").grid(row=0, column=0, padx=10, pady=5)
+    input_entry = tk.Entry(root, width=50)
+    input_entry.grid(row=0, column=1, padx=10, pady=5)
+    browse_input_button = tk.Button(root, text="Browse", command=lambda: browse_folder(input_entry))
+    browse_input_button.grid(row=0, column=2, padx=10, pady=5)
+
+    # Output folder selection
+    tk.Label(root, text="Output Folder:").grid(row=1, column=0, padx=10, pady=5)
+    output_entry = tk.Entry(root, width=50)
+    output_entry.grid(row=1, column=1, padx=10, pady=5)
+    browse_output_button = tk.Button(root, text="Browse", command=lambda: browse_folder(output_entry))
+    browse_output_button.grid(row=1, column=2, padx=10, pady=5)
+
+    # Transformation pipeline selection
+    tk.Label(root, text="Transformation Pipeline:").grid(row=2, column=0, padx=10, pady=5)
+    transform_var = tk.StringVar(value="original")
+    pipeline_options = ["original", "color_manipulation"]
+    for i, option in enumerate(pipeline_options):
+        tk.Radiobutton(root, text=option, variable=transform_var, value=option).grid(row=2, column=i+1)
+
+    # Number of samples entry
+    tk.Label(root, text="Number of Samples:").grid(row=3, column=0, padx=10, pady=5)
+    num_samples_entry = tk.Entry(root, width=50)
+    num_samples_entry.grid(row=3, column=1, padx=10, pady=5)
+
+    # Number of worker processes entry
+    tk.Label(root, text="Workers:").grid(row=4, column=0, padx=10, pady=5)
+    workers_entry = tk.Entry(root, width=50)
+    workers_entry.grid(row=4, column=1, padx=10, pady=5)
+    workers_entry.insert(0, str(os.cpu_count() or 1))
+
+    # Seed entry (leave empty for a random seed)
+    tk.Label(root, text="Seed (optional):").grid(row=5, column=0, padx=10, pady=5)
+    seed_entry = tk.Entry(root, width=50)
+    seed_entry.grid(row=5, column=1, padx=10, pady=5)
+
+    # Variants per source image entry (leave empty to derive it from the number of samples)
+    tk.Label(root, text="Variants per Image (optional):").grid(row=6, column=0, padx=10, pady=5)
+    variants_entry = tk.Entry(root, width=50)
+    variants_entry.grid(row=6, column=1, padx=10, pady=5)
+
+    # Augmentation backend selection (torchvision tensors or the uint8 NumPy/OpenCV kernels)
+    tk.Label(root, text="Backend:").grid(row=7, column=0, padx=10, pady=5)
+    backend_var = tk.StringVar(value="torchvision")
+    for i, option in enumerate(["torchvision", "numpy"]):
+        tk.Radiobutton(root, text=option, variable=backend_var, value=option).grid(row=7, column=i+1)
+
+    # Output size selection (resize back to the source size or keep the crop resolution)
+    tk.Label(root, text="Output Size:").grid(row=8, column=0, padx=10, pady=5)
+    output_size_var = tk.StringVar(value="original")
+    for i, option in enumerate(["original", "crop"]):
+        tk.Radiobutton(root, text=option, variable=output_size_var, value=option).grid(row=8, column=i+1)
+
+    # Resampling filter used when resizing back to the source size
+    tk.Label(root, text="Resampling Filter:").grid(row=9, column=0, padx=10, pady=5)
+    resample_var = tk.StringVar(value="lanczos")
+    tk.OptionMenu(root, resample_var, *RESAMPLING_FILTERS.keys()).grid(row=9, column=1, padx=10, pady=5)
+
+    # Decode JPEGs only at the resolution the crop needs
+    reduced_decode_var = tk.IntVar(value=0)
+    tk.Checkbutton(root, text="Reduced JPEG Decode", variable=reduced_decode_var).grid(row=10, column=1, padx=10, pady=5)
+
+    # Decoded image cache size, kept between runs with 1 worker (leave empty or 0 to disable)
+    tk.Label(root, text="Decoded Cache (MB):").grid(row=11, column=0, padx=10, pady=5)
+    cache_entry = tk.Entry(root, width=50)
+    cache_entry.grid(row=11, column=1, padx=10, pady=5)
+
+    # Output format and quality (quality is used for JPEG and WebP)
+    tk.Label(root, text="Output Format:").grid(row=12, column=0, padx=10, pady=5)
+    format_var = tk.StringVar(value="jpeg")
+    tk.OptionMenu(root, format_var, *OUTPUT_FORMATS.keys()).grid(row=12, column=1, padx=10, pady=5)
+    tk.Label(root, text="Quality:").grid(row=13, column=0, padx=10, pady=5)
+    quality_entry = tk.Entry(root, width=50)
+    quality_entry.grid(row=13, column=1, padx=10, pady=5)
+    quality_entry.insert(0, "75")
+
+    # Run augmentation button
+    run_button = tk.Button(root, text="Run Augmentation", command=run_augmentation)
+    run_button.grid(row=14, column=0, columnspan=3, pady=20)
+
+    # Result label
+    result_label = tk.Label(root, text="")
+    result_label.grid(row=15, column=0, columnspan=3)
+
+    root.mainloop()
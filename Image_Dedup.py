@@ -0,0 +1,171 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+THUMB_SIZE = 32
+
+### Decoding: every image is only needed as a tiny grayscale thumbnail
+def load_thumbnail(path):
+    with Image.open(path) as img:
+        # JPEGs decode straight at 1/8 scale, the resize only has a small image left to work on
+        img.draft("L", (THUMB_SIZE * 2, THUMB_SIZE * 2))
+        return np.asarray(img.convert("L").resize((THUMB_SIZE, THUMB_SIZE), Image.Resampling.BOX), dtype=np.float32)
+
+def load_thumbnails(paths, num_threads=8):
+    # Decoding releases the GIL, so threads keep every core busy here
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        return np.stack(list(pool.map(load_thumbnail, paths)))
+
+### Batched hashing over an (N, 32, 32) stack of thumbnails, each hash is one uint64
+def _pack_bits(bits):
+    # (N, 64) booleans -> (N,) uint64
+    return np.packbits(bits.astype(np.uint8), axis=1).view(">u8").ravel().astype(np.uint64)
+
+def _dhash_matrices():
+    # Average 4 rows into 1 (32 -> 8) and linearly resample the 32 columns onto 9 points
+    rows = np.kron(np.eye(8), np.full((1, 4), 0.25))
+    positions = np.linspace(0, THUMB_SIZE - 1, 9)
+    cols = np.zeros((THUMB_SIZE, 9))
+    for j, p in enumerate(positions):
+        lo = int(np.floor(p))
+        hi = min(lo + 1, THUMB_SIZE - 1)
+        cols[lo, j] += 1 - (p - lo)
+        cols[hi, j] += p - lo
+    return rows, cols
+
+def dhash_batch(thumbs):
+    # Difference hash: is each pixel brighter than its right neighbour on an 8x9 grid
+    rows, cols = _dhash_matrices()
+    small = rows @ thumbs @ cols
+    return _pack_bits((small[:, :, 1:] > small[:, :, :-1]).reshape(len(thumbs), 64))
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    d = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    d[0] /= np.sqrt(2.0)
+    return d
+
+def phash_batch(thumbs):
+    # Perceptual hash: low-frequency 8x8 DCT block compared to its median (DC term left out of the median)
+    d = _dct_matrix(THUMB_SIZE)
+    low = (d @ thumbs @ d.T)[:, :8, :8].reshape(len(thumbs), 64)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack_bits(low > median)
+
+HASH_FUNCTIONS = {"dhash": dhash_batch, "phash": phash_batch}
+
+### Hamming distance on uint64 arrays
+if hasattr(np, "bitwise_count"):
+    def popcount(values):
+        return np.bitwise_count(values)
+else:
+    _BYTE_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(values):
+        return _BYTE_COUNTS[np.ascontiguousarray(values).view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+### Multi-index hashing: exact Hamming-radius search without comparing against every stored hash
+class MultiIndexHashIndex:
+    # The 64-bit hash is cut into num_chunks 16-bit pieces with a lookup table each. Two hashes within
+    # radius r must agree to within r // num_chunks bits on at least one piece (pigeonhole), so a query
+    # only has to probe the buckets near each of its pieces and check those candidates in full.
+    def __init__(self, radius, num_chunks=4):
+        self.radius = radius
+        self.num_chunks = num_chunks
+        self.chunk_bits = 64 // num_chunks
+        self.tables = [dict() for _ in range(num_chunks)]
+        self.hashes = np.zeros(1024, dtype=np.uint64)
+        self.ids = []
+
+        # Every flip pattern of up to r // num_chunks bits within one chunk
+        per_chunk = radius // num_chunks
+        masks = [0]
+        for k in range(1, per_chunk + 1):
+            for bits in combinations(range(self.chunk_bits), k):
+                masks.append(sum(1 << b for b in bits))
+        self.masks = masks
+
+    def _chunks(self, value):
+        value = int(value)
+        mask = (1 << self.chunk_bits) - 1
+        return [(value >> (i * self.chunk_bits)) & mask for i in range(self.num_chunks)]
+
+    def add(self, value, item_id):
+        slot = len(self.ids)
+        if slot == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.zeros_like(self.hashes)])
+        self.hashes[slot] = value
+        self.ids.append(item_id)
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            table.setdefault(chunk, []).append(slot)
+
+    def query(self, value):
+        # Returns (item_id, distance) for every stored hash within the radius, nearest first
+        candidates = set()
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            for m in self.masks:
+                bucket = table.get(chunk ^ m)
+                if bucket:
+                    candidates.update(bucket)
+        if not candidates:
+            return []
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = popcount(self.hashes[slots] ^ np.uint64(value))
+        close = distances <= self.radius
+        order = np.argsort(distances[close], kind="stable")
+        return [(self.ids[s], int(d)) for s, d in zip(slots[close][order], distances[close][order])]
+
+    def __len__(self):
+        return len(self.ids)
+
+### Finding and removing near-duplicates
+def list_images(folder):
+    with os.scandir(folder) as entries:
+        return sorted(e.path for e in entries if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS))
+
+def find_duplicates(paths, method="phash", threshold=6, batch_size=4096, num_threads=8):
+    # Walks the images in order and keeps the first of every group of near-identical images. Only kept
+    # images go into the index, so a folder full of repeated frames stays a small index.
+    # Returns (duplicate path, kept path it matches, Hamming distance) for each duplicate.
+    hash_fn = HASH_FUNCTIONS[method]
+    index = MultiIndexHashIndex(threshold)
+    duplicates = []
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        hashes = hash_fn(load_thumbnails(batch, num_threads=num_threads))
+        for path, value in zip(batch, hashes):
+            matches = index.query(value)
+            if matches:
+                duplicates.append((path, matches[0][0], matches[0][1]))
+            else:
+                index.add(value, path)
+    return duplicates
+
+def quarantine_duplicates(duplicates, quarantine_folder=None):
+    # Moves each duplicate (and its YOLO label sidecar) into quarantine_folder, or deletes it when no folder is given
+    if quarantine_folder:
+        os.makedirs(quarantine_folder, exist_ok=True)
+    for path, _, _ in duplicates:
+        label = os.path.splitext(path)[0] + ".txt"
+        if not quarantine_folder:
+            for file_path in (path, label):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            continue
+        # Earlier runs (or another folder's a.jpg) may have left the same name in quarantine already, number the
+        # stem until neither the image nor its label name is taken, so both stay paired and nothing is overwritten
+        stem, ext = os.path.splitext(os.path.basename(path))
+        new_stem, n = stem, 0
+        while (os.path.lexists(os.path.join(quarantine_folder, new_stem + ext))
+               or os.path.lexists(os.path.join(quarantine_folder, new_stem + ".txt"))):
+            n += 1
+            new_stem = f"{stem}_{n}"
+        for file_path, file_ext in ((path, ext), (label, ".txt")):
+            if os.path.exists(file_path):
+                shutil.move(file_path, os.path.join(quarantine_folder, new_stem + file_ext))
+    return len(duplicates)
@@ -1,14 +1,19 @@
 import numpy as np
-import win32gui, win32ui, win32con  # type: ignore
+try:
+    import win32gui  # type: ignore
+except ImportError:
+    win32gui = None  # Not on Windows, only region/replay/synthetic backends are available
 import ctypes
 import cv2
-from PIL import Image, ImageGrab
-from time import sleep
+from PIL import Image
+from time import time
 import os
+import queue
 import tkinter as tk
-from threading import Thread
+from threading import Thread, Lock
 from tkinter import messagebox
-import ctypes
+from Frame_Container import FrameContainerWriter, encode_jpeg, next_image_index
+from Capture_Backends import CaptureScheduler, ChangeDetector, TICK_POLICIES, CHANGE_METRICS, FrameRing, GDIWindowBackend, REGION_BACKENDS, RegionSplitter, open_region_backend, open_multi_region_backend
 
 #This bit fixes DPI scaling issue which can occur with pixel offsets
 try:
@@ -17,108 +22,241 @@ except Exception as e:
     pass  # For Windows 8.1 and later
 
 
+DROP_POLICIES = ("block", "drop_newest", "drop_oldest")
+# "images" writes one JPEG per frame, "container" appends them all to recording.frames (see Frame_Container.py)
+OUTPUT_MODES = ("images", "container")
+
 class WindowCapture:
-    def __init__(self, window_name=None, delay=0.3, region=None):
+    def __init__(self, window_name=None, delay=0.3, region=None, output_folder="images", queue_size=64, encoder_threads=2, drop_policy="block", tick_policy="skip", change_detector=None, region_backend="mss", backend=None, regions=None, output_mode="images"):
         self.window_name = window_name
         self.delay = delay
         self.region = region  # Tuple: (left, top, right, bottom)
         self.running = False
 
-        if self.window_name:
+        # Capture -> encode pipeline settings. drop_policy decides what happens when the encoders fall behind:
+        # "block" makes capture wait, "drop_newest" discards the new frame, "drop_oldest" discards the oldest queued one
+        if drop_policy not in DROP_POLICIES:
+            raise Exception('Unknown drop policy: {}'.format(drop_policy))
+        self.output_folder = output_folder
+        self.queue_size = queue_size
+        self.encoder_threads = encoder_threads
+        self.drop_policy = drop_policy
+        if output_mode not in OUTPUT_MODES:
+            raise Exception('Unknown output mode: {}'.format(output_mode))
+        self.output_mode = output_mode
+        self.containers = {}
+        self.captured = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.counter_lock = Lock()
+
+        # Fixed-rate timing, delay is the target interval between captures
+        self.scheduler = CaptureScheduler(delay, tick_policy)
+        self.log_lock = Lock()
+
+        # Optional ChangeDetector, when set only frames that differ from the last saved one are written
+        self.change_detector = change_detector
+        self.unchanged = 0
+
+        # regions is an optional {name: (left, top, right, bottom)} dict. Without a window or backend they are screen
+        # coordinates and only their bounding box is grabbed, otherwise they are relative to the captured image.
+        # Each region is saved to its own subfolder of output_folder.
+        self.regions = regions
+        self.splitter = None
+
+        # Frames come from a CaptureBackend, pass one in directly to capture from a replay or synthetic source
+        if regions and backend is None and not self.window_name:
+            self.backend, self.splitter = open_multi_region_backend(regions, region_backend)
+        elif backend is not None:
+            self.backend = backend
+        elif self.window_name:
             # Initialize for window capture
+            if win32gui is None:
+                raise Exception('Window capture is only available on Windows.')
             self.hwnd = win32gui.FindWindow(None, self.window_name)
             if not self.hwnd:
                 raise Exception('Window not found: {}'.format(window_name))
 
             window_rect = win32gui.GetWindowRect(self.hwnd)
-            self.w = window_rect[2] - window_rect[0]
-            self.h = window_rect[3] - window_rect[1]
+            w = window_rect[2] - window_rect[0]
+            h = window_rect[3] - window_rect[1]
 
             border_pixels = 8
             titlebar_pixels = 30
-            self.w = self.w - (border_pixels * 2)
-            self.h = self.h - titlebar_pixels - border_pixels
-            self.cropped_x = border_pixels
-            self.cropped_y = titlebar_pixels
+            w = w - (border_pixels * 2)
+            h = h - titlebar_pixels - border_pixels
+            self.backend = GDIWindowBackend(self.hwnd, w, h, border_pixels, titlebar_pixels)
         elif self.region:
             # Initialize for region capture
-            self.left, self.top, self.right, self.bottom = self.region
-            self.w = self.right - self.left
-            self.h = self.bottom - self.top
+            self.backend = open_region_backend(self.region, region_backend)
         else:
-            raise Exception('Either window_name or region must be specified.')
-
-    def get_screenshot(self):
-        if self.window_name:
-            return self._capture_window()
-        elif self.region:
-            return self._capture_screen_region()
-        else:
-            return None
-
-    def _capture_window(self):
-        hwnd_dc = None
-        mfc_dc = None
-        bitmap = None
+            raise Exception('Either window_name, region, regions or backend must be specified.')
+        self.w = self.backend.width
+        self.h = self.backend.height
+        if regions and self.splitter is None:
+            self.splitter = RegionSplitter(regions, frame_size=(self.w, self.h))
+
+    def get_screenshot(self, out=None):
+        return self.backend.grab(out)
+
+    def _image_folders(self):
+        if self.splitter is None:
+            return [self.output_folder]
+        return [os.path.join(self.output_folder, name) for name in self.regions]
+
+    def _next_image_index(self):
+        # Scan the folder(s) once at start, after that file names come from a counter shared by all regions
+        return max(next_image_index(folder) for folder in self._image_folders())
+
+    def _enqueue_frame(self, frames, item):
+        if self.drop_policy == "block":
+            frames.put(item)
+            return True
         try:
-            hwnd_dc = ctypes.windll.user32.GetDC(self.hwnd)
-            mfc_dc = ctypes.windll.gdi32.CreateCompatibleDC(hwnd_dc)
-            bitmap = ctypes.windll.gdi32.CreateCompatibleBitmap(hwnd_dc, self.w, self.h)
-            ctypes.windll.gdi32.SelectObject(mfc_dc, bitmap)
-            ctypes.windll.gdi32.BitBlt(mfc_dc, 0, 0, self.w, self.h, hwnd_dc, self.cropped_x, self.cropped_y, 0x00CC0020)
-
-            bmpstr = ctypes.create_string_buffer(self.w * self.h * 4)
-            ctypes.windll.gdi32.GetBitmapBits(bitmap, len(bmpstr), bmpstr)
-            img = np.frombuffer(bmpstr, dtype='uint8')
-            img.shape = (self.h, self.w, 4)  # BGRA format
-
-            # Clean up
-            ctypes.windll.gdi32.DeleteObject(bitmap)
-            ctypes.windll.gdi32.DeleteDC(mfc_dc)
-            ctypes.windll.user32.ReleaseDC(self.hwnd, hwnd_dc)
-
-            # Convert BGRA to RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
-            return img
-
-        except Exception as e:
-            if bitmap:
-                ctypes.windll.gdi32.DeleteObject(bitmap)
-            if mfc_dc:
-                ctypes.windll.gdi32.DeleteDC(mfc_dc)
-            if hwnd_dc:
-                ctypes.windll.user32.ReleaseDC(self.hwnd, hwnd_dc)
-            print(f"Error capturing window: {e}")
-            return None
-
-    def _capture_screen_region(self):
-        try:
-            img = ImageGrab.grab(bbox=(self.left, self.top, self.right, self.bottom))
-            img = np.array(img)
-            return img
-        except Exception as e:
-            print(f"Error capturing screen region: {e}")
-            return None
+            frames.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.drop_policy == "drop_oldest":
+            try:
+                _, old_frame, _, _, _ = frames.get_nowait()
+                old_frame.release()
+                frames.task_done()
+                with self.counter_lock:
+                    self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                frames.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+        with self.counter_lock:
+            self.dropped += 1
+        return False
+
+    def _encode_frames(self, frames, log_file):
+        # Encoder thread: JPEG encoding releases the GIL, so this runs alongside the capture loop
+        while True:
+            item = frames.get()
+            try:
+                if item is None:
+                    return
+                index, frame, frame_time, wall_time, change_score = item
+                file_name = f"img_{index}.jpg"
+                try:
+                    if self.splitter is None:
+                        outputs = {None: frame.array}
+                    else:
+                        # Views into the one grabbed frame, every region lands in its own folder
+                        outputs = self.splitter.split(frame.array)
+                    for name, img in outputs.items():
+                        if self.output_mode == "container":
+                            # Times and change score go into the container's own index
+                            self.containers[name].append(encode_jpeg(img), frame_time, wall_time, change_score)
+                            continue
+                        relative_path = file_name if name is None else f"{name}/{file_name}"
+                        Image.fromarray(img).save(os.path.join(self.output_folder, relative_path))
+                        # Capture time of every written frame, lines can land slightly out of order
+                        with self.log_lock:
+                            log_file.write(f"{relative_path},{frame_time:.6f},{wall_time:.6f}\n")
+                finally:
+                    # Encoded, the buffer can go back to the capture thread
+                    frame.release()
+                with self.counter_lock:
+                    self.written += 1
+            except Exception as e:
+                print(f"Error saving frame: {e}")
+                # Still accounted for, so the stats know this frame is done with
+                with self.counter_lock:
+                    self.failed += 1
+            finally:
+                frames.task_done()
+
+    def get_stats(self):
+        with self.counter_lock:
+            stats = {"captured": self.captured, "written": self.written, "failed": self.failed, "dropped": self.dropped, "unchanged": self.unchanged}
+        stats.update(self.scheduler.get_stats())
+        return stats
 
     def generate_image_dataset(self):
-        if not os.path.exists("images"):
-            os.mkdir("images")
+        for folder in [self.output_folder] + self._image_folders():
+            if not os.path.exists(folder):
+                os.mkdir(folder)
+
+        # frame_time is seconds since this session started (monotonic), wall_time is the Unix time
+        log_file = None
+        score_detector = None
+        if self.output_mode == "container":
+            # One append-only container per folder instead of a file per frame, recording.frames plus its index
+            names = [None] if self.splitter is None else list(self.regions)
+            self.containers = {name: FrameContainerWriter(os.path.join(folder, "recording.frames"))
+                               for name, folder in zip(names, self._image_folders())}
+            # Change score of every frame against the previous one, so extraction can pick frames by it later
+            score_detector = ChangeDetector()
+        else:
+            log_path = os.path.join(self.output_folder, "capture_log.csv")
+            new_log = not os.path.exists(log_path)
+            log_file = open(log_path, "a")
+            if new_log:
+                log_file.write("file,frame_time,wall_time\n")
+
+        # Frames are captured into reused buffers, enough of them for a full queue plus one per encoder and the
+        # frame being captured, so the ring never runs dry before the queue's drop policy kicks in
+        ring = FrameRing(self.w, self.h, capacity=self.queue_size + max(1, self.encoder_threads) + 2)
+        frames = queue.Queue(maxsize=self.queue_size)
+        encoders = [Thread(target=self._encode_frames, args=(frames, log_file), daemon=True) for _ in range(max(1, self.encoder_threads))]
+        for t in encoders:
+            t.start()
+
+        index = self._next_image_index()
         while self.running:
-            img = self.get_screenshot()
-            if img is not None:
-                im = Image.fromarray(img)
-                im.save(f"./images/img_{len(os.listdir('images'))}.jpg")
+            frame_time = self.scheduler.wait()
+            if not self.running:
+                break
+            wall_time = time()
+            frame = ring.acquire()
+            if self.get_screenshot(out=frame.array) is not None:
+                with self.counter_lock:
+                    self.captured += 1
+                if self.change_detector is not None and not self.change_detector.should_save(frame.array, frame_time):
+                    frame.release()
+                    with self.counter_lock:
+                        self.unchanged += 1
+                    continue
+                change_score = score_detector.update(frame.array) if score_detector is not None else None
+                if self._enqueue_frame(frames, (index, frame, frame_time, wall_time, change_score)):
+                    index += 1
+                else:
+                    frame.release()
             else:
+                frame.release()
                 print("Failed to capture screenshot.")
                 break
-            sleep(self.delay)
+
+        # Let the encoders finish whatever is still queued before they exit
+        for _ in encoders:
+            frames.put(None)
+        for t in encoders:
+            t.join()
+        if log_file is not None:
+            log_file.close()
+        for container in self.containers.values():
+            container.close()
+        self.backend.close()
+        self.running = False
+        stats = self.get_stats()
+        print(f"Capture finished: {stats['captured']} captured, {stats['written']} written, {stats['failed']} failed, {stats['dropped']} dropped, "
+              f"{stats['unchanged']} unchanged, {stats['achieved_fps']:.2f} FPS achieved (target {stats['target_fps'] or 0:.2f}), "
+              f"jitter {stats['jitter_ms']:.1f} ms, {stats['missed_deadlines']} missed deadlines")
 
 class ScreenshotApp(tk.Tk):
     def __init__(self):
         super().__init__()
         
         self.title("Screenshot Capture GUI")
-        self.geometry("400x400")
+        self.geometry("400x820")
         
         self.capture_mode = tk.StringVar(value="Window")
 
@@ -135,9 +273,14 @@ class ScreenshotApp(tk.Tk):
         # Button to select region
         self.select_region_button = tk.Button(self, text="Select Region", command=self.select_screen_region, state=tk.DISABLED)
         self.select_region_button.pack(pady=5)
+        # Further regions are captured from the same grab and saved to their own folders
+        self.add_region_button = tk.Button(self, text="Add Region", command=lambda: self.select_screen_region(add=True), state=tk.DISABLED)
+        self.add_region_button.pack()
 
         self.region_label = tk.Label(self, text="Selected Region: None")
         self.region_label.pack()
+        self.region_backend = tk.StringVar(value="mss")
+        tk.OptionMenu(self, self.region_backend, *REGION_BACKENDS).pack()
 
         # Delay entry
         self.delay_label = tk.Label(self, text="Delay (seconds):")
@@ -146,24 +289,66 @@ class ScreenshotApp(tk.Tk):
         self.delay_entry.pack(pady=5, padx=20)
         self.delay_entry.insert(0, "0.3")
 
+        # What to do when encoding can't keep up with capturing
+        tk.Label(self, text="When encoding falls behind:").pack()
+        self.drop_policy = tk.StringVar(value="block")
+        tk.OptionMenu(self, self.drop_policy, *DROP_POLICIES).pack()
+
+        # What to do with capture ticks that were missed
+        tk.Label(self, text="When a capture is late:").pack()
+        self.tick_policy = tk.StringVar(value="skip")
+        tk.OptionMenu(self, self.tick_policy, *TICK_POLICIES).pack()
+
+        # Separate JPEG files, or one packed recording to extract frames from later
+        tk.Label(self, text="Save frames as:").pack()
+        self.output_mode = tk.StringVar(value="images")
+        tk.OptionMenu(self, self.output_mode, *OUTPUT_MODES).pack()
+
+        # Change detection: skip frames that look the same as the last saved one
+        self.save_changes_only = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text="Only save changed frames", variable=self.save_changes_only).pack()
+        change_frame = tk.Frame(self)
+        change_frame.pack(pady=5)
+        self.change_metric = tk.StringVar(value="mean")
+        tk.OptionMenu(change_frame, self.change_metric, *CHANGE_METRICS).grid(row=0, column=0, rowspan=2)
+        tk.Label(change_frame, text="Threshold").grid(row=0, column=1)
+        tk.Label(change_frame, text="Min s").grid(row=0, column=2)
+        tk.Label(change_frame, text="Max s").grid(row=0, column=3)
+        self.change_threshold_entry = tk.Entry(change_frame, width=6)
+        self.change_threshold_entry.grid(row=1, column=1, padx=2)
+        self.change_threshold_entry.insert(0, "4")
+        self.min_interval_entry = tk.Entry(change_frame, width=6)
+        self.min_interval_entry.grid(row=1, column=2, padx=2)
+        self.min_interval_entry.insert(0, "0")
+        self.max_interval_entry = tk.Entry(change_frame, width=6)
+        self.max_interval_entry.grid(row=1, column=3, padx=2)
+        self.max_interval_entry.insert(0, "60")
+
         # Start and stop buttons
         self.start_button = tk.Button(self, text="Start Capturing", command=self.start_capturing)
         self.start_button.pack(pady=10, padx=10)
         self.stop_button = tk.Button(self, text="Stop Capturing", state=tk.DISABLED, command=self.stop_capturing)
         self.stop_button.pack(pady=10, padx=10)
 
+        # Frame counters while capturing
+        self.stats_label = tk.Label(self, text="")
+        self.stats_label.pack()
+
         # Bind capture mode change
         self.capture_mode.trace('w', self.on_capture_mode_change) #trace was depreciated but it works trace_add doesn't work
         self.selected_region = None
+        self.selected_regions = []
 
     def on_capture_mode_change(self, *args):
         mode = self.capture_mode.get()
         if mode == "Window":
             self.window_name_entry.config(state=tk.NORMAL)
             self.select_region_button.config(state=tk.DISABLED)
+            self.add_region_button.config(state=tk.DISABLED)
         elif mode == "Region":
             self.window_name_entry.config(state=tk.DISABLED)
             self.select_region_button.config(state=tk.NORMAL)
+            self.add_region_button.config(state=tk.NORMAL)
 
     def start_capturing(self):
         delay_str = self.delay_entry.get()
@@ -173,6 +358,18 @@ class ScreenshotApp(tk.Tk):
             print("Invalid delay value. Please enter a number.")
             return
 
+        change_detector = None
+        if self.save_changes_only.get():
+            try:
+                max_interval = self.max_interval_entry.get().strip()
+                change_detector = ChangeDetector(threshold=float(self.change_threshold_entry.get()),
+                                                 metric=self.change_metric.get(),
+                                                 min_interval=float(self.min_interval_entry.get() or 0),
+                                                 max_interval=float(max_interval) if max_interval else None)
+            except ValueError:
+                print("Invalid change detection values. Please enter numbers.")
+                return
+
         mode = self.capture_mode.get()
         if mode == "Window":
             window_name = self.window_name_entry.get()
@@ -180,7 +377,7 @@ class ScreenshotApp(tk.Tk):
                 print("Please enter a window name.")
                 return
             try:
-                self.wc = WindowCapture(window_name=window_name, delay=delay)
+                self.wc = WindowCapture(window_name=window_name, delay=delay, drop_policy=self.drop_policy.get(), tick_policy=self.tick_policy.get(), change_detector=change_detector, output_mode=self.output_mode.get())
             except Exception as e:
                 print(str(e))
                 return
@@ -188,25 +385,45 @@ class ScreenshotApp(tk.Tk):
             if not self.selected_region:
                 print("Please select a region first.")
                 return
-            self.wc = WindowCapture(region=self.selected_region, delay=delay)
+            regions = None
+            if len(self.selected_regions) > 1:
+                regions = {f"region_{i + 1}": r for i, r in enumerate(self.selected_regions)}
+            self.wc = WindowCapture(region=self.selected_region, regions=regions, region_backend=self.region_backend.get(), delay=delay, drop_policy=self.drop_policy.get(), tick_policy=self.tick_policy.get(), change_detector=change_detector, output_mode=self.output_mode.get())
         else:
             print("Unknown capture mode.")
             return
 
         self.wc.running = True
-        Thread(target=self.wc.generate_image_dataset).start()
+        self.capture_thread = Thread(target=self.wc.generate_image_dataset)
+        self.capture_thread.start()
 
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
+        self.update_stats()
+
+    def update_stats(self):
+        # Poll the counters from the Tk thread, keep going until the encoders have drained after a stop
+        if not hasattr(self, 'wc'):
+            return
+        stats = self.wc.get_stats()
+        self.stats_label.config(text=f"Captured: {stats['captured']}  Written: {stats['written']}  Failed: {stats['failed']}  Dropped: {stats['dropped']}  Unchanged: {stats['unchanged']}\n"
+                                     f"FPS: {stats['achieved_fps']:.2f}  Jitter: {stats['jitter_ms']:.1f} ms  Missed: {stats['missed_deadlines']}")
+        if self.wc.running or self.capture_thread.is_alive() or stats['written'] + stats['failed'] + stats['dropped'] + stats['unchanged'] < stats['captured']:
+            self.after(500, self.update_stats)
+        else:
+            # Only once the last session's encoders are done can a new one pick its first image index
+            self.start_button.config(state=tk.NORMAL)
+            self.stop_button.config(state=tk.DISABLED)
 
     def stop_capturing(self):
         if hasattr(self, 'wc'):
             self.wc.running = False
 
-        self.start_button.config(state=tk.NORMAL)
+        # Start comes back from update_stats once the queued frames are written
         self.stop_button.config(state=tk.DISABLED)
 
-    def select_screen_region(self):
+    def select_screen_region(self, add=False):
+        self.adding_region = add
         messagebox.showinfo("Select Region", "Please click and drag to select the region.")
 
         # Hide the main window
@@ -243,14 +460,22 @@ class ScreenshotApp(tk.Tk):
         end_x = self.selection_window.winfo_pointerx()
         end_y = self.selection_window.winfo_pointery()
 
-        self.selected_region = (
+        region = (
             min(self.start_x, end_x),
             min(self.start_y, end_y),
             max(self.start_x, end_x),
             max(self.start_y, end_y)
         )
+        if self.adding_region and self.selected_regions:
+            self.selected_regions.append(region)
+        else:
+            self.selected_regions = [region]
+        self.selected_region = self.selected_regions[0]
 
-        self.region_label.config(text=f"Selected Region: {self.selected_region}")
+        if len(self.selected_regions) == 1:
+            self.region_label.config(text=f"Selected Region: {self.selected_region}")
+        else:
+            self.region_label.config(text=f"Selected Regions: {len(self.selected_regions)} (one grab)")
 
         self.canvas_widget.destroy()
         self.selection_window.destroy()
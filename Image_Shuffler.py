@@ -1,23 +1,257 @@
 import os
+import re
+import json
 import random
 import shutil
-from tkinter import Tk, Button, Label, filedialog
+import queue
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import Tk, Button, Label, Entry, filedialog, messagebox
+import Image_Dedup
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+SPLITS = ("train", "val", "test")
+
+def label_path_for(image_path):
+    # YOLO label sidecar: same name with a .txt extension
+    return os.path.splitext(image_path)[0] + ".txt"
 
 class LabelUtils:
-    def __init__(self, source_folder, shuffled_folder):
+    JOURNAL_NAME = ".shuffle_journal.json"
+
+    def __init__(self, source_folder, shuffled_folder, num_threads=8):
         self.source_folder = source_folder
         self.shuffled_folder = shuffled_folder
+        self.num_threads = num_threads
+        self.journal_path = os.path.join(self.shuffled_folder, self.JOURNAL_NAME)
 
     def create_shuffled_images_folder(self):
         if not os.path.exists(self.shuffled_folder):
             os.mkdir(self.shuffled_folder)
 
-        image_files = [f for f in os.listdir(self.source_folder) if f.endswith(".jpg")]
+        # Finish (or fail loudly on) a previous interrupted shuffle before planning a new one
+        if self.has_pending_journal():
+            raise RuntimeError("An earlier shuffle was interrupted. Resume or roll it back first.")
+
+        moves = self.plan_shuffle()
+        self._write_journal(moves)
+        return self._execute(moves)
+
+    def plan_shuffle(self):
+        # One scandir of each folder up front instead of a listdir per moved file
+        with os.scandir(self.source_folder) as entries:
+            image_files = [e.name for e in entries if e.is_file() and e.name.endswith(".jpg")]
         random.shuffle(image_files)
 
-        for img in image_files:
-            shutil.move(os.path.join(self.source_folder, img), 
-                        os.path.join(self.shuffled_folder, f"img_{len(os.listdir(self.shuffled_folder))}.jpg"))
+        # Continue numbering after whatever is already in the shuffled folder
+        pattern = re.compile(r"img_(\d+)\.jpg$")
+        next_index = 0
+        with os.scandir(self.shuffled_folder) as entries:
+            for e in entries:
+                match = pattern.match(e.name)
+                if match:
+                    next_index = max(next_index, int(match.group(1)) + 1)
+
+        # Label sidecars travel with their image and get the matching new name
+        with os.scandir(self.source_folder) as entries:
+            label_files = {e.name for e in entries if e.name.endswith(".txt")}
+        moves = []
+        for k, img in enumerate(image_files):
+            new_name = f"img_{next_index + k}"
+            moves.append((os.path.join(self.source_folder, img), os.path.join(self.shuffled_folder, new_name + ".jpg")))
+            label = os.path.splitext(img)[0] + ".txt"
+            if label in label_files:
+                moves.append((os.path.join(self.source_folder, label), os.path.join(self.shuffled_folder, new_name + ".txt")))
+        return moves
+
+    ### Journal: the full rename plan is on disk before the first file moves
+    def has_pending_journal(self):
+        return os.path.exists(self.journal_path)
+
+    def _write_journal(self, moves):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"moves": moves}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _read_journal(self):
+        with open(self.journal_path) as f:
+            return [tuple(move) for move in json.load(f)["moves"]]
+
+    def resume(self):
+        # Moves whose destination already exists were done before the interruption
+        moves = [(src, dst) for src, dst in self._read_journal() if os.path.exists(src) and not os.path.exists(dst)]
+        return self._execute(moves)
+
+    def rollback(self):
+        # Put every file that was already moved back where it came from
+        moves = [(dst, src) for src, dst in self._read_journal() if os.path.exists(dst) and not os.path.exists(src)]
+        return self._execute(moves)
+
+    def _execute(self, moves):
+        # Renames inside one volume are metadata-only, running them in parallel hides per-file latency on network shares
+        errors = []
+
+        def move(pair):
+            try:
+                os.rename(*pair)
+            except OSError:
+                try:
+                    shutil.move(*pair)
+                except OSError as e:
+                    errors.append(e)
+
+        with ThreadPoolExecutor(max_workers=self.num_threads) as pool:
+            list(pool.map(move, moves))
+
+        if errors:
+            # Keep the journal so the shuffle can still be resumed or rolled back
+            raise RuntimeError(f"{len(errors)} of {len(moves)} files could not be moved: {errors[0]}")
+        os.remove(self.journal_path)
+        return len(moves)
+
+class DatasetSplitter:
+    # Splits a folder of images (plus YOLO .txt sidecars) into train/val/test by ratio, stratified by class.
+    # The split folders are filled with hardlinks or symlinks to the originals, so nothing is copied unless
+    # the filesystem can't link, and re-splitting just throws the links away and makes new ones.
+    LINK_MODES = ("hardlink", "symlink", "copy")
+
+    def __init__(self, source_folder, output_folder, ratios=(0.8, 0.1, 0.1), link_mode="hardlink", seed=None):
+        if len(ratios) != len(SPLITS) or any(r < 0 for r in ratios) or sum(ratios) <= 0:
+            raise ValueError("Ratios must be three non-negative numbers for train, val and test.")
+        if link_mode not in self.LINK_MODES:
+            raise ValueError(f"Link mode must be one of {', '.join(self.LINK_MODES)}.")
+        if os.path.abspath(output_folder) == os.path.abspath(source_folder):
+            raise ValueError("The split output folder can't be the source folder.")
+        self.source_folder = source_folder
+        self.output_folder = output_folder
+        self.ratios = [r / sum(ratios) for r in ratios]
+        self.link_mode = link_mode
+        self.rng = random.Random(seed)
+
+    def find_samples(self):
+        # (image path, label path or None, set of class ids)
+        with os.scandir(self.source_folder) as entries:
+            names = {e.name for e in entries if e.is_file()}
+        samples = []
+        for name in sorted(names):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            image_path = os.path.join(self.source_folder, name)
+            label_path = label_path_for(image_path)
+            if os.path.basename(label_path) in names:
+                samples.append((image_path, label_path, self.read_classes(label_path)))
+            else:
+                samples.append((image_path, None, set()))
+        return samples
+
+    @staticmethod
+    def read_classes(label_path):
+        classes = set()
+        with open(label_path) as f:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    classes.add(parts[0])
+        return classes
+
+    def assign(self, samples):
+        # Stratify on the rarest class in each image so rare classes are spread over every split,
+        # images without labels form their own group
+        frequency = Counter(c for _, _, classes in samples for c in classes)
+        strata = defaultdict(list)
+        for sample in samples:
+            classes = sample[2]
+            key = min(classes, key=lambda c: (frequency[c], c)) if classes else None
+            strata[key].append(sample)
+
+        assignment = {split: [] for split in SPLITS}
+        assigned = [0] * len(SPLITS)
+        seen = 0
+        for key in sorted(strata, key=str):
+            group = strata[key]
+            self.rng.shuffle(group)
+            # Largest-remainder rounding on the running totals: a split that got the extra item from one group
+            # is behind the others in the next, so rounding doesn't pile up in one split across many groups.
+            # Equal remainders are broken at random rather than always in SPLITS order.
+            seen += len(group)
+            want = [seen * r - a for r, a in zip(self.ratios, assigned)]
+            counts = [max(0, int(w)) for w in want]
+            while sum(counts) > len(group):
+                counts[min((i for i in range(len(SPLITS)) if counts[i]), key=lambda i: want[i] - counts[i])] -= 1
+            order = sorted(range(len(SPLITS)), key=lambda i: (want[i] - counts[i], self.rng.random()), reverse=True)
+            for i in order[:len(group) - sum(counts)]:
+                counts[i] += 1
+            assigned = [a + c for a, c in zip(assigned, counts)]
+            start = 0
+            for split, count in zip(SPLITS, counts):
+                assignment[split].extend(group[start:start + count])
+                start += count
+        return assignment
+
+    def _link(self, src, dst):
+        # Returns how the file ended up in place, falling back link -> symlink -> copy
+        modes = self.LINK_MODES[self.LINK_MODES.index(self.link_mode):]
+        if os.path.lexists(dst):
+            # copy2 would overwrite it without a word, links fail but must not fall back to that copy
+            raise FileExistsError(f"{dst} already exists")
+        for mode in modes:
+            try:
+                if mode == "hardlink":
+                    os.link(src, dst)
+                elif mode == "symlink":
+                    os.symlink(os.path.abspath(src), dst)
+                else:
+                    shutil.copy2(src, dst)
+                return mode
+            except FileExistsError:
+                # Another source took the name meanwhile, same as above
+                raise
+            except (OSError, NotImplementedError):
+                if mode == "copy":
+                    raise
+        return None
+
+    def _clear_split_folders(self):
+        # Only the split folders are emptied. They hold links or copies, the originals stay untouched.
+        for kind in ("images", "labels"):
+            for split in SPLITS:
+                folder = os.path.join(self.output_folder, kind, split)
+                os.makedirs(folder, exist_ok=True)
+                with os.scandir(folder) as entries:
+                    for e in entries:
+                        if e.is_file(follow_symlinks=False) or e.is_symlink():
+                            os.remove(e.path)
+
+    def split(self):
+        samples = self.find_samples()
+        if not samples:
+            raise ValueError("No images found to split.")
+        assignment = self.assign(samples)
+        self._clear_split_folders()
+
+        used = Counter()
+        jobs = []
+        for split, split_samples in assignment.items():
+            for image_path, label_path, _ in split_samples:
+                jobs.append((image_path, os.path.join(self.output_folder, "images", split, os.path.basename(image_path))))
+                if label_path:
+                    jobs.append((label_path, os.path.join(self.output_folder, "labels", split, os.path.basename(label_path))))
+
+        # e.g. a.jpg and a.png both own a.txt, refuse before anything is linked
+        destinations = Counter(os.path.basename(dst) for _, dst in jobs)
+        clashes = sorted(name for name, n in destinations.items() if n > 1)
+        if clashes:
+            raise ValueError(f"Several images would share these split files: {', '.join(clashes[:5])}")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for mode in pool.map(lambda job: self._link(*job), jobs):
+                used[mode] += 1
+
+        return {"counts": {split: len(s) for split, s in assignment.items()}, "link_modes": dict(used)}
 
 class ImageShufflerApp:
     def __init__(self, root):
@@ -25,7 +259,7 @@ class ImageShufflerApp:
         self.root.title("Image Shuffler")
 
         # Set the window size
-        root.geometry("300x150")
+        root.geometry("300x370")
 
         self.label = Label(root, text="Choose the folder with images to shuffle:")
         self.label.pack(pady=10)
@@ -36,6 +270,26 @@ class ImageShufflerApp:
         self.shuffle_button = Button(root, text="Shuffle Images", command=self.shuffle_images, state='disabled')
         self.shuffle_button.pack(pady=5)
 
+        # Train/val/test ratios for the split mode
+        self.ratio_label = Label(root, text="Train, Val, Test Ratios:")
+        self.ratio_label.pack()
+        self.ratio_entry = Entry(root)
+        self.ratio_entry.insert(0, "0.8, 0.1, 0.1")
+        self.ratio_entry.pack(pady=5)
+
+        self.split_button = Button(root, text="Split Train/Val/Test", command=self.split_dataset, state='disabled')
+        self.split_button.pack(pady=5)
+
+        # Near-duplicate removal, threshold is the max Hamming distance between 64-bit perceptual hashes
+        self.threshold_label = Label(root, text="Duplicate Threshold (bits):")
+        self.threshold_label.pack()
+        self.threshold_entry = Entry(root)
+        self.threshold_entry.insert(0, "6")
+        self.threshold_entry.pack(pady=5)
+
+        self.dedup_button = Button(root, text="Quarantine Duplicates", command=self.remove_duplicates, state='disabled')
+        self.dedup_button.pack(pady=5)
+
         self.source_folder = None
 
     def select_folder(self):
@@ -43,12 +297,87 @@ class ImageShufflerApp:
         if self.source_folder:
             self.label.config(text=f"Selected Folder: {self.source_folder}")
             self.shuffle_button.config(state='normal')
+            self.split_button.config(state='normal')
+            self.dedup_button.config(state='normal')
 
     def shuffle_images(self):
         shuffled_folder = os.path.join(self.source_folder, "shuffled_images")
         lbUtils = LabelUtils(self.source_folder, shuffled_folder)
-        lbUtils.create_shuffled_images_folder()
-        self.label.config(text="Images have been shuffled!")
+        try:
+            if lbUtils.has_pending_journal():
+                answer = messagebox.askyesnocancel("Unfinished Shuffle",
+                                                   "The last shuffle of this folder was interrupted.\n"
+                                                   "Yes: finish it. No: roll it back.")
+                if answer is None:
+                    return
+                if answer:
+                    moved = lbUtils.resume()
+                    self.label.config(text=f"Finished the interrupted shuffle ({moved} images moved).")
+                else:
+                    moved = lbUtils.rollback()
+                    self.label.config(text=f"Rolled back the interrupted shuffle ({moved} images restored).")
+                return
+            moved = lbUtils.create_shuffled_images_folder()
+            self.label.config(text=f"{moved} images have been shuffled!")
+        except (OSError, RuntimeError) as e:
+            messagebox.showerror("Error", str(e))
+
+    def split_dataset(self):
+        try:
+            ratios = [float(r) for r in self.ratio_entry.get().split(",")]
+            splitter = DatasetSplitter(self.source_folder, os.path.join(self.source_folder, "splits"), ratios)
+            result = splitter.split()
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        counts = result["counts"]
+        self.label.config(text=f"Split: {counts['train']} train, {counts['val']} val, {counts['test']} test")
+        print(f"Split files placed by: {result['link_modes']}")
+
+    def remove_duplicates(self):
+        try:
+            threshold = int(self.threshold_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "The duplicate threshold must be a whole number.")
+            return
+
+        # Hashing a big folder takes a while, run it off the Tk thread and poll for the result
+        self.label.config(text="Looking for duplicates...")
+        self.dedup_button.config(state='disabled')
+        results = queue.Queue()
+
+        def scan():
+            try:
+                paths = Image_Dedup.list_images(self.source_folder)
+                results.put((paths, Image_Dedup.find_duplicates(paths, threshold=threshold), None))
+            except Exception as e:
+                results.put((None, None, e))
+
+        threading.Thread(target=scan, daemon=True).start()
+        self.root.after(100, self.poll_duplicates, results)
+
+    def poll_duplicates(self, results):
+        try:
+            paths, duplicates, error = results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_duplicates, results)
+            return
+        self.dedup_button.config(state='normal')
+        if error is not None:
+            messagebox.showerror("Error", str(error))
+            self.label.config(text="Duplicate search failed.")
+            return
+        if not duplicates:
+            self.label.config(text=f"No duplicates among {len(paths)} images.")
+            return
+
+        quarantine = os.path.join(self.source_folder, "duplicates")
+        if not messagebox.askyesno("Duplicates Found", f"{len(duplicates)} of {len(paths)} images are near-duplicates.\n"
+                                                      f"Move them (and their labels) to {quarantine}?"):
+            self.label.config(text="Duplicates left in place.")
+            return
+        moved = Image_Dedup.quarantine_duplicates(duplicates, quarantine)
+        self.label.config(text=f"{moved} duplicates moved to the duplicates folder.")
 
 if __name__ == "__main__":
     root = Tk()
@@ -0,0 +1,260 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+from Exported_Model import load_detector
+
+### Shared-memory frame ring: fixed-size RGB slots that every process maps, so frames are never pickled
+class SharedFrameRing:
+    # The owning process creates it (create=True) and decides which slots are free, the inference workers
+    # attach by name and only read the slot they were told to. Slot bookkeeping stays in the owner.
+    def __init__(self, width, height, slots, name=None, create=True):
+        self.shape = (height, width, 3)
+        self.slots = slots
+        self.slot_size = height * width * 3
+        self.owner = create
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slot_size * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.free = list(range(slots))
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        # Index of a free slot, None if none frees up within timeout
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.free, timeout):
+                return None
+            return self.free.pop()
+
+    def release(self, slot):
+        with self.condition:
+            if slot not in self.free:
+                self.free.append(slot)
+                self.condition.notify()
+
+    def close(self):
+        # Views have to go before the mapping can be closed
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+### Compact detections: plain arrays that pickle in a few hundred bytes, unlike ultralytics Results
+def detections_from_results(result):
+    # Torch tensors from ultralytics, plain arrays from the exported-model runtimes
+    boxes = result.boxes
+    to_numpy = lambda x: x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+    return {"xyxy": to_numpy(boxes.xyxy).astype(np.float32),
+            "conf": to_numpy(boxes.conf).astype(np.float32),
+            "cls": to_numpy(boxes.cls).astype(np.int32)}
+
+def empty_detections():
+    return {"xyxy": np.zeros((0, 4), np.float32), "conf": np.zeros(0, np.float32), "cls": np.zeros(0, np.int32)}
+
+def class_color(class_id):
+    # Stable, well spread colour per class
+    hue = (class_id * 47) % 180
+    return tuple(int(c) for c in cv2.cvtColor(np.uint8([[[hue, 220, 255]]]), cv2.COLOR_HSV2RGB)[0, 0])
+
+### Micro-batching: frames from one stream over time, or from several regions at once, run as one model call
+def collect_batch(get, max_batch, max_wait):
+    # Blocks for the first item, then keeps taking items until the batch is full or max_wait seconds have
+    # passed since the first one arrived. get(timeout) returns an item or raises queue.Empty. A None item
+    # means stop, it ends the batch and is returned as the second value.
+    first = get(None)
+    if first is None:
+        return [], True
+    batch = [first]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_batch:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = get(remaining)
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+class BatchStats:
+    # Batch sizes, model time per batch and submit-to-result latency per frame
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.batches = 0
+        self.frames = 0
+        self.model_seconds = 0.0
+        self.latencies = []
+
+    def add(self, size, model_seconds, latencies):
+        with self.lock:
+            self.batches += 1
+            self.frames += size
+            self.model_seconds += model_seconds
+            self.latencies.extend(latencies)
+            # Only the recent window matters for the percentiles
+            if len(self.latencies) > 10000:
+                del self.latencies[:5000]
+
+    def get_stats(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.start_time, 1e-9)
+            latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+            return {"batches": self.batches, "frames": self.frames,
+                    "mean_batch": self.frames / self.batches if self.batches else 0.0,
+                    "frames_per_sec": self.frames / elapsed,
+                    "model_ms_per_frame": self.model_seconds * 1000 / self.frames if self.frames else 0.0,
+                    "latency_p50_ms": float(np.percentile(latencies, 50)),
+                    "latency_p95_ms": float(np.percentile(latencies, 95))}
+
+def format_batch_stats(stats):
+    return (f"{stats['frames']} frames in {stats['batches']} batches (mean {stats['mean_batch']:.2f}), "
+            f"{stats['frames_per_sec']:.1f} frames/s, {stats['model_ms_per_frame']:.1f} ms model time per frame, "
+            f"latency p50 {stats['latency_p50_ms']:.1f} ms / p95 {stats['latency_p95_ms']:.1f} ms")
+
+class MicroBatcher:
+    # submit() a frame and get a Future for its own result back. A single thread gathers submitted frames into
+    # batches of up to max_batch, waiting at most max_wait_ms after the first one, and runs them as one model
+    # call. Bigger batches and longer waits raise throughput, max_wait_ms caps the latency that costs.
+    def __init__(self, model, max_batch=4, max_wait_ms=20):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending = queue.Queue()
+        self.stats = BatchStats()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame):
+        future = Future()
+        self.pending.put((frame, future, time.monotonic()))
+        return future
+
+    def _run(self):
+        get = lambda timeout: self.pending.get(timeout=timeout)
+        while True:
+            batch, stop = collect_batch(get, self.max_batch, self.max_wait)
+            if batch:
+                start = time.monotonic()
+                try:
+                    results = self.model([frame for frame, _, _ in batch], verbose=False)
+                except Exception as e:
+                    for _, future, _ in batch:
+                        future.set_exception(e)
+                else:
+                    done = time.monotonic()
+                    self.stats.add(len(batch), done - start, [done - submitted for _, _, submitted in batch])
+                    for (_, future, _), result in zip(batch, results):
+                        future.set_result(result)
+            if stop:
+                return
+
+    def get_stats(self):
+        return self.stats.get_stats()
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join(timeout=5)
+
+### Worker processes
+def _inference_worker(ring_name, width, height, slots, model_path, threads, tasks, results, max_batch=1, max_wait_ms=0, runtime="pytorch", precision="fp32"):
+    # Runs in its own process: attach to the ring, load and warm up the model, then answer (slot, frame_id) tasks with
+    # (slot, frame_id, detections) until a None task arrives. Tasks are micro-batched like MicroBatcher does,
+    # and each batch reports ("stats", None, (size, model seconds, latencies)) so the owner can aggregate.
+    try:
+        model = load_detector(model_path, runtime, precision, threads, warmup_shape=(height, width),
+                              warmup_batches=sorted({1, max_batch}))
+        ring = SharedFrameRing(width, height, slots, name=ring_name, create=False)
+    except Exception as e:
+        results.put(("error", None, str(e)))
+        return
+    results.put(("ready", None, dict(model.names)))
+    get = lambda timeout: tasks.get(timeout=timeout)
+    try:
+        while True:
+            batch, stop = collect_batch(get, max_batch, max_wait_ms / 1000.0)
+            if batch:
+                start = time.monotonic()
+                try:
+                    batch_results = model([ring.frames[slot] for slot, _, _ in batch], verbose=False)
+                    detections = [detections_from_results(r) for r in batch_results]
+                except Exception as e:
+                    print(f"Error running YOLO: {e}")
+                    detections = [empty_detections() for _ in batch]
+                done = time.monotonic()
+                # Submit times come from the owner's monotonic clock, which is the same system-wide clock
+                results.put(("stats", None, (len(batch), done - start, [done - submitted for _, _, submitted in batch])))
+                for (slot, frame_id, _), d in zip(batch, detections):
+                    results.put((slot, frame_id, d))
+            if stop:
+                break
+    finally:
+        ring.close()
+
+class InferenceWorkerPool:
+    # num_workers spawned processes sharing one task queue. Each loads the model itself, since model objects
+    # don't pickle, and CPU threads are split between them so they don't fight over the same cores.
+    # threads = 0 splits all cores evenly, runtime / precision pick the backend as in Exported_Model.
+    def __init__(self, ring, model_path, num_workers=1, max_batch=1, max_wait_ms=0, runtime="pytorch", precision="fp32", threads=0):
+        ctx = multiprocessing.get_context("spawn")
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.num_workers = num_workers
+        self.names = {}
+        self.stats = BatchStats()
+        threads = threads or max(1, (os.cpu_count() or 1) // num_workers)
+        height, width = ring.shape[:2]
+        self.processes = [ctx.Process(target=_inference_worker, daemon=True,
+                                      args=(ring.name, width, height, ring.slots, model_path, threads,
+                                            self.tasks, self.results, max_batch, max_wait_ms, runtime, precision))
+                          for _ in range(num_workers)]
+        for p in self.processes:
+            p.start()
+
+    def wait_ready(self, timeout=120):
+        # Blocks until every worker has loaded its model, raises if one of them couldn't
+        for _ in self.processes:
+            kind, _, payload = self.results.get(timeout=timeout)
+            if kind == "error":
+                raise Exception(f"Inference worker failed to start: {payload}")
+            self.names = payload
+        # Throughput counts from here, not from when the processes were still loading models
+        self.stats = BatchStats()
+
+    def submit(self, slot, frame_id):
+        self.tasks.put((slot, frame_id, time.monotonic()))
+
+    def get_result(self, timeout=None):
+        # (slot, frame_id, detections) or None on timeout, batch stats from the workers are taken in passing
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                result = self.results.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if result[0] == "stats":
+                self.stats.add(*result[2])
+                continue
+            return result
+
+    def get_stats(self):
+        return self.stats.get_stats()
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
@@ -3,12 +3,16 @@ from tkinter import messagebox
 import cv2
 import PIL.Image, PIL.ImageTk
 import numpy as np
-from ultralytics import YOLO
 import threading
+import time
+import os
 import ctypes
-from PIL import ImageGrab
 from ctypes import wintypes
 from tkinter import filedialog
+from Box_Tracker import BoxTracker
+from Exported_Model import PRECISIONS, available_runtimes, resolve_runtime, load_detector
+from Inference_Workers import SharedFrameRing, InferenceWorkerPool, MicroBatcher, detections_from_results, class_color, empty_detections, format_batch_stats
+from Capture_Backends import CaptureScheduler, ChangeDetector, FrameRing, grab_into, GDIWindowBackend, ReplayBackend, SyntheticBackend, REGION_BACKENDS, open_region_backend, open_multi_region_backend
 
 #This bit fixes DPI scaling issue which can occur with pixel offsets
 try:
@@ -16,10 +20,12 @@ try:
 except Exception as e:
     pass  # For Windows 8.1 and later
 
-user32 = ctypes.windll.user32
+user32 = ctypes.windll.user32 if hasattr(ctypes, "windll") else None  # Window capture is Windows only
 
 # Function to enumerate all open windows
 def enum_windows():
+    if user32 is None:
+        return []
     EnumWindows = user32.EnumWindows
     EnumWindowsProc = ctypes.WINFUNCTYPE(ctypes.c_bool, ctypes.c_void_p, ctypes.c_void_p)
     GetWindowText = user32.GetWindowTextW
@@ -41,82 +47,457 @@ def enum_windows():
     return titles
 
 class MyVideoCapture:
-    def __init__(self, source_type, source):
+    # source_type picks the CaptureBackend: a window by name or handle, a screen region, a video file or
+    # image folder to replay ('replay'), or generated frames ('synthetic', source is (width, height)).
+    # 'screen_regions' takes a {name: (left, top, right, bottom)} dict and grabs only their bounding box,
+    # splitter.slices then locates each region inside that frame (the pipeline runs YOLO per region).
+    def __init__(self, source_type, source, region_backend="mss"):
         self.source_type = source_type
         self.source = source
+        self.splitter = None
 
-        if self.source_type == 'window_name':
-            self.hwnd = ctypes.windll.user32.FindWindowW(None, self.source)
-            if not self.hwnd:
-                raise Exception(f'Window "{self.source}" not found!')
-
-            # Get window client area size
-            rect = wintypes.RECT()
-            ctypes.windll.user32.GetClientRect(self.hwnd, ctypes.byref(rect))
-            self.width = rect.right - rect.left
-            self.height = rect.bottom - rect.top
-
-        elif self.source_type == 'window_list':
-            self.hwnd = self.source
+        if self.source_type in ['window_name', 'window_list']:
+            if user32 is None:
+                raise Exception('Window capture is only available on Windows.')
+            if self.source_type == 'window_name':
+                self.hwnd = user32.FindWindowW(None, self.source)
+                if not self.hwnd:
+                    raise Exception(f'Window "{self.source}" not found!')
+            else:
+                self.hwnd = self.source
 
             # Get window client area size
             rect = wintypes.RECT()
-            ctypes.windll.user32.GetClientRect(self.hwnd, ctypes.byref(rect))
-            self.width = rect.right - rect.left
-            self.height = rect.bottom - rect.top
+            user32.GetClientRect(self.hwnd, ctypes.byref(rect))
+            self.backend = GDIWindowBackend(self.hwnd, rect.right - rect.left, rect.bottom - rect.top)
 
         elif self.source_type == 'screen_region':
-            self.left, self.top, self.right, self.bottom = self.source
-            self.width = self.right - self.left
-            self.height = self.bottom - self.top
+            self.backend = open_region_backend(self.source, region_backend)
 
-    def get_frame(self):
-        if self.source_type in ['window_name', 'window_list']:
-            return self._capture_window()
-        elif self.source_type == 'screen_region':
-            return self._capture_screen_region()
+        elif self.source_type == 'screen_regions':
+            self.backend, self.splitter = open_multi_region_backend(self.source, region_backend)
 
-    def _capture_window(self):
-        hwnd_dc = None
-        mfc_dc = None
-        bitmap = None
-        try:
-            hwnd_dc = ctypes.windll.user32.GetDC(self.hwnd)
-            mfc_dc = ctypes.windll.gdi32.CreateCompatibleDC(hwnd_dc)
-            bitmap = ctypes.windll.gdi32.CreateCompatibleBitmap(hwnd_dc, self.width, self.height)
-            ctypes.windll.gdi32.SelectObject(mfc_dc, bitmap)
-            ctypes.windll.gdi32.BitBlt(mfc_dc, 0, 0, self.width, self.height, hwnd_dc, 0, 0, 0x00CC0020)
+        elif self.source_type == 'replay':
+            self.backend = ReplayBackend(self.source)
 
-            bmpstr = ctypes.create_string_buffer(self.width * self.height * 4)
-            ctypes.windll.gdi32.GetBitmapBits(bitmap, len(bmpstr), bmpstr)
-            img = np.frombuffer(bmpstr, dtype='uint8').reshape((self.height, self.width, 4))  # BGRA format
+        elif self.source_type == 'synthetic':
+            self.backend = SyntheticBackend(*self.source)
 
-            ctypes.windll.gdi32.DeleteObject(bitmap)
-            ctypes.windll.gdi32.DeleteDC(mfc_dc)
-            ctypes.windll.user32.ReleaseDC(self.hwnd, hwnd_dc)
+        else:
+            raise Exception(f'Unknown source type: {self.source_type}')
 
-            # Convert BGRA to RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
-            return True, img
+        self.width = self.backend.width
+        self.height = self.backend.height
+        # Reused buffers: enough for one frame waiting in and one being worked on by each pipeline stage, plus
+        # the one being captured. Slots are only allocated once they are actually needed.
+        self.ring = FrameRing(self.width, self.height, capacity=6)
 
-        except Exception as e:
-            if bitmap:
-                ctypes.windll.gdi32.DeleteObject(bitmap)
-            if mfc_dc:
-                ctypes.windll.gdi32.DeleteDC(mfc_dc)
-            if hwnd_dc:
-                ctypes.windll.user32.ReleaseDC(self.hwnd, hwnd_dc)
-            print(f"Error capturing window: {e}")
-            return False, None
-
-    def _capture_screen_region(self):
+    def get_frame(self):
+        # Returns (ret, RingFrame), call frame.release() once done with frame.array
+        frame = grab_into(self.backend, self.ring)
+        return frame is not None, frame
+
+    def release(self):
+        self.backend.close()
+
+### Capture -> inference -> render on their own threads, each stage only ever sees the newest item
+class LatestSlot:
+    # Single-slot mailbox between two stages. put() replaces whatever the consumer hasn't taken yet (handing
+    # the replaced item to on_discard), so a slow consumer skips frames instead of building up a backlog.
+    def __init__(self, on_discard=None):
+        self.condition = threading.Condition()
+        self.item = None
+        self.closed = False
+        self.on_discard = on_discard
+        self.discarded = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.closed:
+                # Nobody is going to take it any more
+                old = item
+            else:
+                old, self.item = self.item, item
+                self.condition.notify()
+        if old is not None:
+            self.discarded += 1
+            if self.on_discard:
+                self.on_discard(old)
+
+    def take(self, timeout=None):
+        # Waits for an item and removes it, None once the slot is closed (or on timeout)
+        with self.condition:
+            self.condition.wait_for(lambda: self.item is not None or self.closed, timeout)
+            item, self.item = self.item, None
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        leftover = self.take(0)
+        if leftover is not None and self.on_discard:
+            self.on_discard(leftover)
+
+def _release_frame(item):
+    # Slot items are (array, RingFrame or None, detections or None, class names), the ring frame goes back to
+    # the capture ring
+    if item[1] is not None:
+        item[1].release()
+
+class CapturePipeline:
+    # Three worker threads joined by LatestSlots: capture grabs at the requested rate, inference runs YOLO
+    # on the newest frame (or passes it through) and render turns the newest frame into a PIL image at
+    # display_scale. The Tk thread only takes (image, detections, names) from latest_image() and updates the
+    # canvas, detections are drawn there as canvas items rather than into the pixels.
+    # With max_batch > 1 (or several capture regions) frames go through a MicroBatcher: up to max_batch frames
+    # are kept in flight and run together, waiting at most max_wait_ms for a batch to fill.
+    # With detect_every > 1 or a scene_threshold the detector only runs every detect_every frames or when the
+    # picture changed by more than scene_threshold (mean grey levels) since the last run, and a BoxTracker
+    # moves the boxes along on the frames in between. The tracker needs each detection before the next frame,
+    # so there the regions of one frame still run as one batch, but frames aren't batched over time.
+    def __init__(self, vid, get_model, fps, max_batch=1, max_wait_ms=0, detect_every=1, scene_threshold=None, display_scale=1.0):
+        self.vid = vid
+        self.display_scale = display_scale
+        self.get_model = get_model  # Returns the model to run, or None to show frames as captured
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.batcher = None
+        self.in_flight = threading.BoundedSemaphore(max_batch)
+        if hasattr(vid, "ring"):
+            # Frames in flight hold on to their capture buffer, the ring needs room for all of them
+            vid.ring.capacity = max(vid.ring.capacity, max_batch + 5)
+        self.scheduler = CaptureScheduler(1.0 / fps)
+        self.running = False
+        self.to_inference = LatestSlot(on_discard=_release_frame)
+        self.to_render = LatestSlot(on_discard=_release_frame)
+        self.to_display = LatestSlot()
+        self.counts = {"captured": 0, "inferred": 0, "tracked": 0, "rendered": 0, "displayed": 0}
+        self.detect_every = max(1, detect_every)
+        self.tracking = self.detect_every > 1 or scene_threshold is not None
+        self.tracker = BoxTracker()
+        self.scene_detector = ChangeDetector(threshold=scene_threshold) if scene_threshold is not None else None
+        self.frames_since_detect = 0
+        self.warmed_model = None
+        self.threads = []
+
+    def set_fps(self, fps):
+        self.scheduler.interval = 1.0 / fps
+
+    def start(self):
+        self.running = True
+        self.start_time = time.monotonic()
+        for target in (self._capture_loop, self._inference_loop, self._render_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _capture_loop(self):
+        while self.running:
+            self.scheduler.wait()
+            ret, frame = self.vid.get_frame()
+            if not ret:
+                print("Failed to capture frame.")
+                continue
+            self.counts["captured"] += 1
+            self.to_inference.put((frame.array, frame, None, None))
+
+    def _inference_loop(self):
+        while self.running:
+            item = self.to_inference.take()
+            if item is None:
+                continue
+            model = self.get_model()
+            if model is not None and model is not self.warmed_model:
+                self._warm_up(model)
+            if model is not None and self.tracking:
+                self._detect_or_track(item, model)
+                continue
+            if model is not None and self._batching():
+                self._submit_batched(item, model)
+                continue
+            if model is not None:
+                try:
+                    detections = detections_from_results(model(item[0], verbose=False)[0])
+                    item = (item[0], item[1], detections, model.names)
+                    self.counts["inferred"] += 1
+                except Exception as e:
+                    print(f"Error running YOLO: {e}")
+            self.to_render.put(item)
+
+    def _warm_up(self, model):
+        # Loading warmed the model up at a default size, the capture's own frame (or region) shapes and batch
+        # sizes still need their first run, do it on a blank frame rather than the first real one
+        start = time.monotonic()
+        tiles = [tile for tile, _ in self._tiles(np.zeros((self.vid.height, self.vid.width, 3), np.uint8))]
         try:
-            img = ImageGrab.grab(bbox=(self.left, self.top, self.right, self.bottom))
-            img = np.array(img)
-            return True, img
+            for size in sorted({1, self.max_batch} if self._batching() else {1}):
+                model(tiles * size, verbose=False)
+            print(f"YOLO warmed up for {self.vid.width}x{self.vid.height} in {time.monotonic() - start:.2f}s")
         except Exception as e:
-            print(f"Error capturing screen region: {e}")
-            return False, None
+            print(f"Error warming up YOLO: {e}")
+        self.warmed_model = model
+
+    def _detection_due(self, frame):
+        # True when this frame should go to the detector rather than the tracker
+        self.frames_since_detect += 1
+        due = self.tracker.detections is None or self.frames_since_detect >= self.detect_every
+        if self.scene_detector is not None:
+            # should_save() takes the frame as the new reference when it reports a change
+            if self.scene_detector.should_save(frame, time.monotonic()):
+                due = True
+            elif due:
+                self.scene_detector.update(frame)
+        if due:
+            self.frames_since_detect = 0
+        return due
+
+    def _detect_or_track(self, item, model):
+        frame = item[0]
+        detections = None
+        if self._detection_due(frame):
+            try:
+                if self._batching():
+                    detections = self._detect_batched(frame, model)
+                else:
+                    detections = detections_from_results(model(frame, verbose=False)[0])
+                self.tracker.reset(frame, detections)
+                self.counts["inferred"] += 1
+            except Exception as e:
+                print(f"Error running YOLO: {e}")
+        if detections is None:
+            detections = self.tracker.update(frame)
+            self.counts["tracked"] += 1
+        # Shallow copy, the tracker swaps in new arrays on its next update while this one is being shown
+        self.to_render.put((frame, item[1], dict(detections) if detections is not None else None, model.names))
+
+    def _batching(self):
+        return self.max_batch > 1 or getattr(self.vid, "splitter", None) is not None
+
+    def _get_batcher(self, model):
+        if self.batcher is None or self.batcher.model is not model:
+            if self.batcher is not None:
+                self.batcher.close()
+            tiles_per_frame = len(self.vid.splitter.slices) if getattr(self.vid, "splitter", None) else 1
+            self.batcher = MicroBatcher(model, self.max_batch * tiles_per_frame, self.max_wait_ms)
+        return self.batcher
+
+    def _tiles(self, frame):
+        # Each capture region is its own image in the batch, with its offset in the frame
+        if getattr(self.vid, "splitter", None) is None:
+            return [(frame, (0, 0))]
+        return [(frame[rows, cols], (cols.start, rows.start)) for rows, cols in self.vid.splitter.slices.values()]
+
+    @staticmethod
+    def _merge_tiles(results, tiles):
+        # Boxes are shifted back into frame coordinates
+        parts = [detections_from_results(r) for r in results]
+        for part, (_, (ox, oy)) in zip(parts, tiles):
+            part["xyxy"] += np.float32([ox, oy, ox, oy])
+        return {key: np.concatenate([p[key] for p in parts]) for key in ("xyxy", "conf", "cls")}
+
+    def _detect_batched(self, frame, model):
+        # Blocking: the regions of this frame run as one model call, without waiting for a batch to fill
+        tiles = self._tiles(frame)
+        return self._merge_tiles(model([tile for tile, _ in tiles], verbose=False), tiles)
+
+    def _submit_batched(self, item, model):
+        batcher = self._get_batcher(model)
+        while not self.in_flight.acquire(timeout=0.5):
+            if not self.running:
+                _release_frame(item)
+                return
+
+        frame = item[0]
+        tiles = self._tiles(frame)
+        futures = [batcher.submit(tile) for tile, _ in tiles]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            detections = None
+            try:
+                detections = self._merge_tiles([f.result() for f in futures], tiles)
+            except Exception as e:
+                print(f"Error running YOLO: {e}")
+            self.in_flight.release()
+            if detections is not None:
+                self.counts["inferred"] += 1
+            self.to_render.put((frame, item[1], detections, model.names))
+
+        for f in futures:
+            f.add_done_callback(on_done)
+
+    def _render_loop(self):
+        while self.running:
+            item = self.to_render.take()
+            if item is None:
+                continue
+            frame, _, detections, names = item
+            self._render(frame, detections, names)
+            _release_frame(item)
+
+    def _render(self, frame, detections, names):
+        # The PIL image always owns its pixels (resized or copied), so the capture buffer can be reused
+        # right after. Boxes are scaled along with the image.
+        scale = self.display_scale
+        if scale != 1.0:
+            h, w = frame.shape[:2]
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            image = PIL.Image.fromarray(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+            if detections is not None:
+                detections = dict(detections, xyxy=detections["xyxy"] * scale)
+        else:
+            image = PIL.Image.fromarray(frame).copy()
+        self.counts["rendered"] += 1
+        self.to_display.put((image, detections, names or {}))
+
+    def latest_image(self):
+        # Newest (image, detections, names) since the last call, None if nothing new. Never blocks the Tk thread.
+        image = self.to_display.take(0)
+        if image is not None:
+            self.counts["displayed"] += 1
+        return image
+
+    def get_stats(self):
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        return {stage: count / elapsed for stage, count in self.counts.items()}
+
+    def stop(self):
+        self.running = False
+        for slot in (self.to_inference, self.to_render, self.to_display):
+            slot.close()
+        for t in self.threads:
+            t.join(timeout=2)
+        self.threads = []
+        rates = self.get_stats()
+        print("Pipeline rates (FPS): " + ", ".join(f"{stage} {rate:.1f}" for stage, rate in rates.items()))
+        if self.batcher is not None:
+            self.batcher.close()
+            print("Batched inference: " + format_batch_stats(self.batcher.get_stats()))
+            self.batcher = None
+
+class ProcessCapturePipeline(CapturePipeline):
+    # Same stages, but YOLO runs in worker processes. Frames are captured straight into a shared-memory ring
+    # and only slot numbers travel to the workers, detections come back as small arrays. While every worker is
+    # busy, frames skip inference and are drawn with the newest detections, so capture never waits on YOLO.
+    def __init__(self, vid, model_path, num_workers, is_enabled, fps, max_batch=1, max_wait_ms=0, detect_every=1, scene_threshold=None, display_scale=1.0,
+                 runtime="pytorch", precision="fp32", threads=0):
+        super().__init__(vid, lambda: None, fps, detect_every=detect_every, scene_threshold=scene_threshold, display_scale=display_scale)
+        self.is_enabled = is_enabled  # YOLO checkbox, read per frame
+        self.num_workers = num_workers
+        # Each worker batches up to max_batch frames, so that many can be in flight per worker
+        self.max_in_flight = num_workers * max_batch
+        # Per worker: a batch being inferred and one queued, plus frames waiting for and in rendering
+        self.ring = SharedFrameRing(vid.width, vid.height, slots=2 * self.max_in_flight + 3)
+        self.to_render = LatestSlot(on_discard=lambda item: self.ring.release(item[0]))
+        self.pool = InferenceWorkerPool(self.ring, model_path, num_workers, max_batch, max_wait_ms, runtime, precision, threads)
+        self.in_flight_frames = 0
+        self.in_flight_lock = threading.Lock()
+        self.latest_detections = empty_detections()
+        self.latest_frame_id = -1
+        # Newest frame handed to render, the preview never goes back to an older one
+        self.render_frame_id = -1
+        self.render_lock = threading.Lock()
+        self.tracker_lock = threading.Lock()
+
+    def start(self):
+        try:
+            self.pool.wait_ready()
+        except Exception:
+            self.pool.close()
+            self.ring.close()
+            raise
+        super().start()
+
+    def _capture_loop(self):
+        frame_id = 0
+        while self.running:
+            self.scheduler.wait()
+            slot = self.ring.acquire(timeout=1)
+            if slot is None:
+                continue
+            if self.vid.backend.grab(out=self.ring.frames[slot]) is None:
+                self.ring.release(slot)
+                print("Failed to capture frame.")
+                continue
+            self.counts["captured"] += 1
+            frame_id += 1
+            with self.in_flight_lock:
+                send = self.is_enabled() and self.in_flight_frames < self.max_in_flight
+                if send and self.tracking:
+                    send = self._detection_due(self.ring.frames[slot])
+                if send:
+                    self.in_flight_frames += 1
+            if send:
+                self.pool.submit(slot, frame_id)
+            elif not self._put_render(slot, frame_id, None):
+                self.ring.release(slot)
+
+    def _put_render(self, slot, frame_id, detections):
+        # False (and nothing queued) when a newer frame already went to render
+        with self.render_lock:
+            if frame_id <= self.render_frame_id:
+                return False
+            self.render_frame_id = frame_id
+            self.to_render.put((slot, frame_id, detections))
+            return True
+
+    def _inference_loop(self):
+        # Collects results from the workers, out-of-order results older than what was already shown are dropped.
+        # A result whose frame is older than one already rendered isn't shown either, its boxes are just kept
+        # for the frames after it (and restart the tracker from its frame).
+        while self.running or self.in_flight_frames:
+            result = self.pool.get_result(timeout=0.5)
+            if result is None:
+                if not self.running:
+                    break
+                continue
+            slot, frame_id, detections = result
+            with self.in_flight_lock:
+                self.in_flight_frames -= 1
+            self.counts["inferred"] += 1
+            if frame_id < self.latest_frame_id:
+                self.ring.release(slot)
+                continue
+            self.latest_frame_id = frame_id
+            self.latest_detections = detections
+            if not self._put_render(slot, frame_id, detections):
+                if self.tracking:
+                    with self.tracker_lock:
+                        self.tracker.reset(self.ring.frames[slot], detections)
+                self.ring.release(slot)
+
+    def _render_loop(self):
+        while self.running:
+            item = self.to_render.take()
+            if item is None:
+                continue
+            slot, frame_id, detections = item
+            frame = self.ring.frames[slot]
+            if self.tracking and self.is_enabled():
+                # Fresh detections restart the tracker, every other frame gets the tracked boxes
+                with self.tracker_lock:
+                    if detections is not None:
+                        self.tracker.reset(frame, detections)
+                    else:
+                        detections = self.tracker.update(frame)
+                        detections = dict(detections) if detections is not None else None
+                        self.counts["tracked"] += 1
+            elif detections is None and self.is_enabled():
+                detections = self.latest_detections
+            self._render(frame, detections, self.pool.names)
+            self.ring.release(slot)
+
+    def stop(self):
+        super().stop()
+        print("Worker inference: " + format_batch_stats(self.pool.get_stats()))
+        self.pool.close()
+        self.ring.close()
 
 class App:
     def __init__(self, window, window_title):
@@ -124,6 +505,8 @@ class App:
         self.window.title(window_title)
         self.yolo_enabled = False
         self.model = None
+        self.model_path = None
+        self.model_settings = ("pytorch", "fp32", 0)  # runtime, precision, threads the loaded model uses
 
         # Set the initial window size
         self.window.geometry("500x250")  # Adjusted size
@@ -156,8 +539,13 @@ class App:
 
         # Button for selecting screen region
         self.select_region_button = tk.Button(window, text="Select Region", command=self.select_screen_region)
+        # Several regions are grabbed as one bounding box and each runs through YOLO on its own
+        self.add_region_button = tk.Button(window, text="Add Region", command=lambda: self.select_screen_region(add=True))
         self.region_label = tk.Label(window, text="Selected Region: None")
         self.selected_region = None
+        self.selected_regions = []
+        self.region_backend = tk.StringVar(value="mss")
+        self.region_backend_menu = tk.OptionMenu(window, self.region_backend, *REGION_BACKENDS)
 
         # Start and Stop buttons
         self.start_button = tk.Button(window, text="Start", command=self.start_capture)
@@ -165,16 +553,51 @@ class App:
 
         # Slider to adjust frame rate
         self.slider_label = tk.Label(window, text="Adjust Frame Rate:")
-        self.slider = tk.Scale(window, from_=1, to=30, orient=tk.HORIZONTAL)
+        self.slider = tk.Scale(window, from_=1, to=30, orient=tk.HORIZONTAL, command=self.on_frame_rate_change)
         self.slider.set(15)  # Set initial frame rate
 
         # Checkbox to enable/disable YOLO, alongside the load button
         self.yolo_var = tk.IntVar()
         self.yolo_checkbox = tk.Checkbutton(window, text="Enable YOLO", variable=self.yolo_var, command=self.toggle_yolo)
         self.load_button = tk.Button(window, text="Load YOLO Model", command=self.start_loading_yolo_model)
+
+        # 0 runs YOLO on a thread in this process, more spreads it over that many worker processes
+        self.processes_label = tk.Label(window, text="YOLO Processes:")
+        self.processes_spinbox = tk.Spinbox(window, from_=0, to=max(1, os.cpu_count() or 1), width=5)
+
+        # Micro-batching: frames per YOLO call, and how long to wait for a batch to fill
+        self.batch_label = tk.Label(window, text="Max Batch / Wait (ms):")
+        self.batch_spinbox = tk.Spinbox(window, from_=1, to=32, width=5)
+        self.batch_wait_entry = tk.Entry(window, width=6)
+        self.batch_wait_entry.insert(0, "20")
+
+        # Preview size relative to the capture, smaller keeps the display cheap for big captures
+        self.display_scale_label = tk.Label(window, text="Display Scale:")
+        self.display_scale = tk.StringVar(value="1.0")
+        self.display_scale_menu = tk.OptionMenu(window, self.display_scale, "1.0", "0.75", "0.5", "0.25")
+
+        # Run the detector only every N frames or on a scene change, tracking boxes in between (blank = off)
+        self.detect_label = tk.Label(window, text="Detect Every / Scene Change:")
+        self.detect_every_spinbox = tk.Spinbox(window, from_=1, to=60, width=5)
+        self.scene_threshold_entry = tk.Entry(window, width=6)
+
+        # CPU inference backend: PyTorch as is, or an exported copy run by ONNX Runtime / OpenVINO (0 threads = auto)
+        self.backend_label = tk.Label(window, text="Inference Backend / Precision:")
+        self.backend = tk.StringVar(value="pytorch")
+        # Only the runtimes that are installed are offered
+        self.backend_menu = tk.OptionMenu(window, self.backend, *available_runtimes())
+        self.precision = tk.StringVar(value="fp32")
+        self.precision_menu = tk.OptionMenu(window, self.precision, *PRECISIONS)
+        self.threads_label = tk.Label(window, text="Inference Threads:")
+        self.threads_spinbox = tk.Spinbox(window, from_=0, to=max(1, os.cpu_count() or 1), width=5)
         
         self.canvas = None  # Initialize canvas as None
+        # One canvas image item updated in place, plus pooled rectangle/label items for the detections
+        self.photo = None
+        self.image_item = None
+        self.box_items = []
         self.vid = None    # VideoCapture object will be created later
+        self.pipeline = None
 
         # Set initial delay time in milliseconds
         self.delay = 1000 // self.slider.get()
@@ -185,10 +608,15 @@ class App:
         self.window.mainloop()
 
     def start_loading_yolo_model(self):
-        # Load YOLO model in a separate thread to prevent GUI freezing
-        threading.Thread(target=self.load_yolo_model).start()
+        # Load YOLO model in a separate thread to prevent GUI freezing, settings are read here on the GUI thread
+        try:
+            threads = max(0, int(self.threads_spinbox.get()))
+        except ValueError:
+            threads = 0
+        settings = (self.backend.get(), self.precision.get(), threads)
+        threading.Thread(target=self.load_yolo_model, args=(settings,)).start()
 
-    def load_yolo_model(self):
+    def load_yolo_model(self, settings=("pytorch", "fp32", 0)):
         try:
             # Open a file dialog and allow the user to select a file
             model_path = filedialog.askopenfilename(
@@ -199,9 +627,18 @@ class App:
                 messagebox.showwarning("No File Selected", "No YOLO model file was selected.")
                 return
             
-            self.model = YOLO(model_path)
-            print(f"YOLO model loaded: {model_path}")
-            messagebox.showinfo("Success", f"YOLO model loaded: {model_path}")
+            # Exports on first use (cached by file hash) and warms up here at a default size, the pipeline
+            # warms it up again at the capture's frame shape once capture starts
+            runtime, precision, threads = settings
+            runtime, note = resolve_runtime(runtime)
+            if note:
+                self.backend.set(runtime)
+            self.model = load_detector(model_path, runtime, precision, threads)
+            self.model_path = model_path
+            # The worker processes load the same (possibly fallen back) runtime
+            self.model_settings = (runtime, precision, threads)
+            print(f"YOLO model loaded: {model_path} ({runtime}, {precision}, {threads or 'auto'} threads)")
+            messagebox.showinfo("Success", f"YOLO model loaded: {model_path}" + (f"\n{note}" if note else ""))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load YOLO model: {e}")
 
@@ -211,8 +648,22 @@ class App:
         if not self.model and self.yolo_enabled:
             messagebox.showwarning("Model Not Loaded", "YOLO model is not loaded. Please load the model first.")
 
+    def on_frame_rate_change(self, value):
+        if self.pipeline:
+            self.pipeline.set_fps(int(value))
+
+    def current_model(self):
+        # Read by the inference thread on every frame, so toggling YOLO takes effect right away
+        if self.yolo_enabled and self.model is not None:
+            return self.model
+        return None
+
     def on_closing(self):
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
         if self.vid:
+            self.vid.release()
             self.vid = None
         print("Application is closing.")
         self.window.destroy()
@@ -240,6 +691,8 @@ class App:
         elif method == 'screen_region':
             self.select_region_button.grid(row=2, column=2, padx=10, pady=5)
             self.region_label.grid(row=3, column=2, padx=10, pady=5)
+            self.region_backend_menu.grid(row=2, column=3, padx=10, pady=5)
+            self.add_region_button.grid(row=2, column=1, padx=10, pady=5)
 
         # Grid the rest of the widgets
         self.start_button.grid(row=4, column=1, padx=10, pady=5)
@@ -248,6 +701,21 @@ class App:
         self.slider_label.grid(row=5, column=1, padx=10, pady=5)
         self.slider.grid(row=5, column=2)
         self.yolo_checkbox.grid(row=5, column=3, padx=10, pady=5)
+        self.processes_label.grid(row=6, column=1, padx=10, pady=5)
+        self.processes_spinbox.grid(row=6, column=2)
+        self.display_scale_label.grid(row=9, column=1, padx=10, pady=5)
+        self.display_scale_menu.grid(row=9, column=2)
+        self.batch_label.grid(row=7, column=1, padx=10, pady=5)
+        self.batch_spinbox.grid(row=7, column=2)
+        self.batch_wait_entry.grid(row=7, column=3)
+        self.detect_label.grid(row=8, column=1, padx=10, pady=5)
+        self.detect_every_spinbox.grid(row=8, column=2)
+        self.scene_threshold_entry.grid(row=8, column=3)
+        self.backend_label.grid(row=10, column=1, padx=10, pady=5)
+        self.backend_menu.grid(row=10, column=2)
+        self.precision_menu.grid(row=10, column=3)
+        self.threads_label.grid(row=11, column=1, padx=10, pady=5)
+        self.threads_spinbox.grid(row=11, column=2)
         
 
     def refresh_window_list(self):
@@ -265,7 +733,8 @@ class App:
             self.window_list_var.set('No windows found')
         print("Window list refreshed.")
 
-    def select_screen_region(self):
+    def select_screen_region(self, add=False):
+        self.adding_region = add
         messagebox.showinfo("Select Region", "Please click and drag to select the region.")
 
         # Hide the main window
@@ -302,14 +771,22 @@ class App:
         end_x = self.selection_window.winfo_pointerx()
         end_y = self.selection_window.winfo_pointery()
 
-        self.selected_region = (
+        region = (
             min(self.start_x, end_x),
             min(self.start_y, end_y),
             max(self.start_x, end_x),
             max(self.start_y, end_y)
         )
+        if self.adding_region and self.selected_regions:
+            self.selected_regions.append(region)
+        else:
+            self.selected_regions = [region]
+        self.selected_region = self.selected_regions[0]
 
-        self.region_label.config(text=f"Selected Region: {self.selected_region}")
+        if len(self.selected_regions) == 1:
+            self.region_label.config(text=f"Selected Region: {self.selected_region}")
+        else:
+            self.region_label.config(text=f"Selected Regions: {len(self.selected_regions)} (one grab)")
 
         self.canvas_widget.destroy()
         self.selection_window.destroy()
@@ -347,70 +824,138 @@ class App:
                 messagebox.showwarning("Input Error", "Please select a screen region.")
                 return
             source = self.selected_region  # (left, top, right, bottom)
+            if len(self.selected_regions) > 1:
+                method = 'screen_regions'
+                source = {f"region_{i + 1}": r for i, r in enumerate(self.selected_regions)}
 
         else:
             messagebox.showerror("Error", "Invalid capture method.")
             return
 
         try:
-            self.vid = MyVideoCapture(method, source)
+            self.vid = MyVideoCapture(method, source, region_backend=self.region_backend.get())
         except Exception as e:
             messagebox.showerror("Error", str(e))
             print(f"Error starting capture: {e}")
             return
 
-        # Adjust the window size based on the captured frame dimensions
+        # Adjust the window size based on the (scaled) preview dimensions
+        display_scale = float(self.display_scale.get())
+        display_width = max(1, round(self.vid.width * display_scale))
+        display_height = max(1, round(self.vid.height * display_scale))
         extra_width = 1
-        extra_height = 203
-        self.window.geometry(f"{self.vid.width + extra_width}x{self.vid.height + extra_height}")
+        extra_height = 420
+        self.window.geometry(f"{display_width + extra_width}x{display_height + extra_height}")
         #self.window.geometry(f"{self.vid.width}x{self.vid.height}")
         
         # Create or update canvas
         if self.canvas is None:
-            self.canvas = tk.Canvas(self.window, width=self.vid.width, height=self.vid.height)
-            self.canvas.grid(column=1,columnspan=3, row=6)
+            self.canvas = tk.Canvas(self.window, width=display_width, height=display_height)
+            self.canvas.grid(column=1,columnspan=3, row=12)
         else:
-            self.canvas.config(width=self.vid.width, height=self.vid.height)
+            self.canvas.config(width=display_width, height=display_height)
 
         # Enable stop button and disable start button
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
 
-        # Start the update loop
+        # Capture, inference and rendering run on their own threads, the update loop only displays
+        try:
+            processes = int(self.processes_spinbox.get())
+        except ValueError:
+            processes = 0
+        try:
+            max_batch = max(1, int(self.batch_spinbox.get()))
+            max_wait_ms = max(0.0, float(self.batch_wait_entry.get() or 0))
+        except ValueError:
+            max_batch, max_wait_ms = 1, 0.0
+        try:
+            detect_every = max(1, int(self.detect_every_spinbox.get()))
+            scene_text = self.scene_threshold_entry.get().strip()
+            scene_threshold = float(scene_text) if scene_text else None
+        except ValueError:
+            detect_every, scene_threshold = 1, None
+        try:
+            if processes > 0 and self.model_path:
+                self.pipeline = ProcessCapturePipeline(self.vid, self.model_path, processes,
+                                                       lambda: self.yolo_enabled, self.slider.get(),
+                                                       max_batch, max_wait_ms, detect_every, scene_threshold, display_scale,
+                                                       *self.model_settings)
+            else:
+                self.pipeline = CapturePipeline(self.vid, self.current_model, self.slider.get(), max_batch, max_wait_ms,
+                                                detect_every, scene_threshold, display_scale)
+            self.pipeline.start()
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            print(f"Error starting capture: {e}")
+            self.pipeline = None
+            self.stop_capture()
+            return
         self.update()
 
     def stop_capture(self):
         print("Stop capturing.")
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+        if self.canvas is not None:
+            self.show_detections(None, {})
         if self.vid:
+            self.vid.release()
             self.vid = None
 
         # Disable stop button and enable start button
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
 
+    def show_frame(self, image):
+        # Paste into the existing PhotoImage, a new one (and the single canvas item pointing at it) is only
+        # needed when the frame size changes
+        if self.photo is None or (self.photo.width(), self.photo.height()) != image.size:
+            self.photo = PIL.ImageTk.PhotoImage(image=image)
+            if self.image_item is None:
+                self.image_item = self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
+            else:
+                self.canvas.itemconfig(self.image_item, image=self.photo)
+            self.canvas.tag_lower(self.image_item)
+        else:
+            self.photo.paste(image)
+
+    def show_detections(self, detections, names):
+        # Boxes are canvas items reused from frame to frame, extra ones are hidden rather than deleted
+        count = 0 if detections is None else len(detections["xyxy"])
+        while len(self.box_items) < count:
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, width=2)
+            label = self.canvas.create_text(0, 0, anchor=tk.SW, font=("TkDefaultFont", 9, "bold"))
+            self.box_items.append((rect, label))
+        for i, (rect, label) in enumerate(self.box_items):
+            if i >= count:
+                self.canvas.itemconfig(rect, state=tk.HIDDEN)
+                self.canvas.itemconfig(label, state=tk.HIDDEN)
+                continue
+            x1, y1, x2, y2 = (float(c) for c in detections["xyxy"][i])
+            class_id = int(detections["cls"][i])
+            color = "#%02x%02x%02x" % class_color(class_id)
+            self.canvas.coords(rect, x1, y1, x2, y2)
+            self.canvas.itemconfig(rect, outline=color, state=tk.NORMAL)
+            self.canvas.coords(label, x1, max(y1, 12))
+            self.canvas.itemconfig(label, text=f"{names.get(class_id, class_id)} {detections['conf'][i]:.2f}",
+                                   fill=color, state=tk.NORMAL)
+
     def update(self):
         try:
-            ret = False  # Initialize ret as False
-            frame = None  # Initialize frame as None
-
-            if self.vid is not None:
-                ret, frame = self.vid.get_frame()
-
-                if ret:
-                    if self.yolo_enabled and hasattr(self, 'model'):
-                        results = self.model(frame)
-                        annotated_frame = results[0].plot()
-                        self.photo = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(annotated_frame))
-                    else:
-                        self.photo = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(frame))
-                    self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
-
-            # Adjust delay based on the slider value
-            self.delay = 1000 // self.slider.get()
-
-            # Schedule the `update` method to be called after a delay
-            if self.vid is not None:  # Continue updating only if capturing
-                self.window.after(self.delay, self.update)
+            if self.pipeline is None:
+                return
+            # Only blit here, everything else already happened on the pipeline threads
+            latest = self.pipeline.latest_image()
+            if latest is not None:
+                image, detections, names = latest
+                self.show_frame(image)
+                self.show_detections(detections, names)
+
+            # Poll faster than the capture rate so a new frame shows up as soon as it is rendered
+            self.delay = max(1, 500 // self.slider.get())
+            self.window.after(self.delay, self.update)
         except Exception as e:
             print(f"Error in update loop: {e}")
             self.stop_capture()